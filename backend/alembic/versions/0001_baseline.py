@@ -0,0 +1,84 @@
+"""Baseline schema (users with JSON blobs, battle_logs, deployed_bases)
+
+Databases created by `Base.metadata.create_all` before migrations existed
+already have these tables, so each one is only created when missing.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_baseline"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in tables:
+        op.create_table(
+            "users",
+            sa.Column("username", sa.String(), primary_key=True),
+            sa.Column("password", sa.String()),
+            sa.Column("auth_provider", sa.String()),
+            sa.Column("coins", sa.Integer()),
+            sa.Column("trophies", sa.Integer()),
+            sa.Column("wins", sa.Integer()),
+            sa.Column("experience", sa.Integer()),
+            sa.Column("tutorial_progress", sa.Integer()),
+            sa.Column("joined_at", sa.DateTime()),
+            sa.Column("lives", sa.Integer()),
+            sa.Column("last_lives_reset", sa.Date()),
+            sa.Column("base", sa.JSON()),
+            sa.Column("drafts", sa.JSON()),
+            sa.Column("base_history", sa.JSON()),
+            sa.Column("active_attacks", sa.JSON()),
+        )
+        op.create_index("ix_users_username", "users", ["username"])
+
+    if "battle_logs" not in tables:
+        op.create_table(
+            "battle_logs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("timestamp", sa.DateTime()),
+            sa.Column("attacker_id", sa.String(), sa.ForeignKey("users.username")),
+            sa.Column("defender_id", sa.String(), sa.ForeignKey("users.username")),
+            sa.Column("winner_id", sa.String()),
+            sa.Column("score", sa.Integer()),
+            sa.Column("replay_data", sa.JSON()),
+            sa.Column("level_snapshot", sa.JSON()),
+            sa.Column("is_revenged", sa.Boolean()),
+        )
+        op.create_index("ix_battle_logs_id", "battle_logs", ["id"])
+
+    if "deployed_bases" not in tables:
+        op.create_table(
+            "deployed_bases",
+            sa.Column("username", sa.String(), sa.ForeignKey("users.username"), primary_key=True),
+            sa.Column("trophies", sa.Integer()),
+            sa.Column("level", sa.Integer()),
+            sa.Column("name", sa.String()),
+            sa.Column("grid_size", sa.Integer()),
+            sa.Column("goal_count", sa.Integer()),
+            sa.Column("updated_at", sa.DateTime()),
+        )
+        op.create_index("ix_deployed_bases_trophies", "deployed_bases", ["trophies"])
+        op.create_index("ix_deployed_bases_level", "deployed_bases", ["level"])
+        op.create_index("ix_deployed_bases_level_trophies", "deployed_bases", ["level", "trophies"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("deployed_bases")
+    op.drop_table("battle_logs")
+    op.drop_table("users")
@@ -0,0 +1,272 @@
+"""Split users.base/drafts/base_history/active_attacks into their own tables
+
+Moves every JSON blob into `bases`, `base_history`, `drafts` and
+`attack_sessions`, then drops the old columns. Rows that already exist in
+the new tables (e.g. written by the app before the migration ran) are kept.
+
+Revision ID: 0002_split_user_blobs
+Revises: 0001_baseline
+Create Date: 2026-10-18 00:00:00
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+from uuid import uuid4
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_split_user_blobs"
+down_revision: Union[str, Sequence[str], None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LEGACY_COLUMNS = ("base", "drafts", "base_history", "active_attacks")
+
+# Lightweight table definitions for the data copy (independent of app models)
+legacy_users = sa.table(
+    "users",
+    sa.column("username", sa.String()),
+    *(sa.column(name, sa.JSON()) for name in LEGACY_COLUMNS),
+)
+bases = sa.table(
+    "bases",
+    sa.column("username", sa.String()),
+    sa.column("level", sa.JSON()),
+    sa.column("programs", sa.JSON()),
+    sa.column("analysis", sa.JSON()),
+    sa.column("updated_at", sa.DateTime()),
+)
+base_history = sa.table(
+    "base_history",
+    sa.column("id", sa.String()),
+    sa.column("username", sa.String()),
+    sa.column("submitted_at", sa.DateTime()),
+    sa.column("level", sa.JSON()),
+    sa.column("programs", sa.JSON()),
+)
+drafts = sa.table(
+    "drafts",
+    sa.column("id", sa.String()),
+    sa.column("username", sa.String()),
+    sa.column("name", sa.String()),
+    sa.column("updated_at", sa.DateTime()),
+    sa.column("level", sa.JSON()),
+    sa.column("programs", sa.JSON()),
+)
+attack_sessions = sa.table(
+    "attack_sessions",
+    sa.column("attacker_id", sa.String()),
+    sa.column("target_user", sa.String()),
+    sa.column("started_at", sa.DateTime()),
+    sa.column("expires_at", sa.DateTime()),
+    sa.column("snapshot_id", sa.String()),
+    sa.column("frozen_level", sa.JSON()),
+)
+
+
+def _parse_time(value, default):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _create_tables(existing):
+    user_fk = lambda: sa.ForeignKey("users.username", ondelete="CASCADE")
+
+    if "bases" not in existing:
+        op.create_table(
+            "bases",
+            sa.Column("username", sa.String(), user_fk(), primary_key=True),
+            sa.Column("level", sa.JSON()),
+            sa.Column("programs", sa.JSON()),
+            sa.Column("analysis", sa.JSON(), nullable=True),
+            sa.Column("updated_at", sa.DateTime()),
+        )
+
+    if "base_history" not in existing:
+        op.create_table(
+            "base_history",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("username", sa.String(), user_fk(), nullable=False),
+            sa.Column("submitted_at", sa.DateTime()),
+            sa.Column("level", sa.JSON()),
+            sa.Column("programs", sa.JSON()),
+        )
+        op.create_index(
+            "ix_base_history_username_submitted_at", "base_history", ["username", "submitted_at"]
+        )
+
+    if "drafts" not in existing:
+        op.create_table(
+            "drafts",
+            sa.Column("id", sa.String(), primary_key=True),
+            sa.Column("username", sa.String(), user_fk(), nullable=False),
+            sa.Column("name", sa.String()),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("level", sa.JSON()),
+            sa.Column("programs", sa.JSON()),
+        )
+        op.create_index("ix_drafts_username_updated_at", "drafts", ["username", "updated_at"])
+
+    if "attack_sessions" not in existing:
+        op.create_table(
+            "attack_sessions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("attacker_id", sa.String(), user_fk(), nullable=False),
+            sa.Column("target_user", sa.String(), nullable=False),
+            sa.Column("started_at", sa.DateTime()),
+            sa.Column("expires_at", sa.DateTime(), nullable=False),
+            sa.Column("snapshot_id", sa.String(), nullable=True),
+            sa.Column("frozen_level", sa.JSON()),
+        )
+        op.create_index(
+            "ix_attack_sessions_attacker_target",
+            "attack_sessions",
+            ["attacker_id", "target_user"],
+            unique=True,
+        )
+
+
+def _copy_legacy_data(bind):
+    now = datetime.utcnow()
+    have_base = {r[0] for r in bind.execute(sa.select(bases.c.username))}
+    have_history = {r[0] for r in bind.execute(sa.select(base_history.c.id))}
+    have_drafts = {r[0] for r in bind.execute(sa.select(drafts.c.id))}
+    have_sessions = set(bind.execute(
+        sa.select(attack_sessions.c.attacker_id, attack_sessions.c.target_user)
+    ).all())
+
+    for row in bind.execute(sa.select(legacy_users)).mappings():
+        username = row["username"]
+
+        base = row["base"]
+        if base and base.get("level") and username not in have_base:
+            bind.execute(bases.insert().values(
+                username=username,
+                level=base["level"],
+                programs=base.get("programs") or {},
+                analysis=base.get("analysis"),
+                updated_at=now,
+            ))
+
+        for h in row["base_history"] or []:
+            entry_id = h.get("id") or str(uuid4())
+            if entry_id in have_history:
+                continue
+            have_history.add(entry_id)
+            bind.execute(base_history.insert().values(
+                id=entry_id,
+                username=username,
+                submitted_at=_parse_time(h.get("submittedAt"), now),
+                level=h.get("level"),
+                programs=h.get("programs"),
+            ))
+
+        for d in row["drafts"] or []:
+            draft_id = d.get("id") or str(uuid4())
+            if draft_id in have_drafts:
+                continue
+            have_drafts.add(draft_id)
+            bind.execute(drafts.insert().values(
+                id=draft_id,
+                username=username,
+                name=d.get("name"),
+                updated_at=_parse_time(d.get("updatedAt"), now),
+                level=d.get("level"),
+                programs=d.get("programs"),
+            ))
+
+        for a in row["active_attacks"] or []:
+            key = (username, a.get("target_user"))
+            expires_at = _parse_time(a.get("expires_at"), None)
+            if key[1] is None or expires_at is None or key in have_sessions:
+                continue
+            have_sessions.add(key)
+            bind.execute(attack_sessions.insert().values(
+                attacker_id=username,
+                target_user=key[1],
+                started_at=_parse_time(a.get("started_at"), now),
+                expires_at=expires_at,
+                snapshot_id=a.get("snapshot_id"),
+                frozen_level=a.get("frozen_level"),
+            ))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    _create_tables(set(inspector.get_table_names()))
+
+    user_columns = {c["name"] for c in inspector.get_columns("users")}
+    legacy = [name for name in LEGACY_COLUMNS if name in user_columns]
+    if not legacy:
+        return
+
+    if len(legacy) == len(LEGACY_COLUMNS):
+        _copy_legacy_data(bind)
+
+    with op.batch_alter_table("users") as batch:
+        for name in legacy:
+            batch.drop_column(name)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    with op.batch_alter_table("users") as batch:
+        for name in LEGACY_COLUMNS:
+            batch.add_column(sa.Column(name, sa.JSON()))
+
+    snapshots = {}
+    for r in bind.execute(sa.select(bases)).mappings():
+        snapshot = {"level": r["level"], "programs": r["programs"]}
+        if r["analysis"] is not None:
+            snapshot["analysis"] = r["analysis"]
+        snapshots[r["username"]] = snapshot
+
+    history, user_drafts, attacks = {}, {}, {}
+    for r in bind.execute(sa.select(base_history).order_by(base_history.c.submitted_at)).mappings():
+        history.setdefault(r["username"], []).append({
+            "id": r["id"],
+            "level": r["level"],
+            "programs": r["programs"],
+            "submittedAt": r["submitted_at"].isoformat(),
+        })
+    for r in bind.execute(sa.select(drafts).order_by(drafts.c.updated_at)).mappings():
+        user_drafts.setdefault(r["username"], []).append({
+            "id": r["id"],
+            "name": r["name"],
+            "level": r["level"],
+            "programs": r["programs"],
+            "updatedAt": r["updated_at"].isoformat(),
+        })
+    for r in bind.execute(sa.select(attack_sessions)).mappings():
+        attacks.setdefault(r["attacker_id"], []).append({
+            "target_user": r["target_user"],
+            "started_at": r["started_at"].isoformat(),
+            "expires_at": r["expires_at"].isoformat(),
+            "snapshot_id": r["snapshot_id"],
+            "frozen_level": r["frozen_level"],
+        })
+
+    for (username,) in bind.execute(sa.select(legacy_users.c.username)).all():
+        bind.execute(
+            legacy_users.update()
+            .where(legacy_users.c.username == username)
+            .values(
+                base=snapshots.get(username),
+                drafts=user_drafts.get(username, []),
+                base_history=history.get(username, []),
+                active_attacks=attacks.get(username, []),
+            )
+        )
+
+    op.drop_table("attack_sessions")
+    op.drop_table("drafts")
+    op.drop_table("base_history")
+    op.drop_table("bases")
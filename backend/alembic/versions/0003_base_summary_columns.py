@@ -0,0 +1,61 @@
+"""Precomputed base_info summary columns on bases
+
+Revision ID: 0003_base_summary_columns
+Revises: 0002_split_user_blobs
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_base_summary_columns"
+down_revision: Union[str, Sequence[str], None] = "0002_split_user_blobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+bases = sa.table(
+    "bases",
+    sa.column("username", sa.String()),
+    sa.column("level", sa.JSON()),
+    sa.column("name", sa.String()),
+    sa.column("grid_size", sa.Integer()),
+    sa.column("goal_count", sa.Integer()),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("bases")}
+    if "goal_count" in columns:
+        # Table was created from the current models
+        return
+
+    with op.batch_alter_table("bases") as batch:
+        batch.add_column(sa.Column("name", sa.String()))
+        batch.add_column(sa.Column("grid_size", sa.Integer()))
+        batch.add_column(sa.Column("goal_count", sa.Integer()))
+
+    bind = op.get_bind()
+    for username, level in bind.execute(sa.select(bases.c.username, bases.c.level)).all():
+        level = level or {}
+        bind.execute(
+            bases.update()
+            .where(bases.c.username == username)
+            .values(
+                name=level.get("name", "Unknown Base"),
+                grid_size=level.get("gridSize"),
+                goal_count=len(level.get("goals", [])),
+            )
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("bases") as batch:
+        batch.drop_column("goal_count")
+        batch.drop_column("grid_size")
+        batch.drop_column("name")
@@ -0,0 +1,79 @@
+"""Incremental leaderboard counters (win_counters)
+
+Seeds the counters from battle_logs once: the alltime totals plus one
+row per day for the last 7 days.
+
+Revision ID: 0004_win_counters
+Revises: 0003_base_summary_columns
+Create Date: 2026-10-18 00:00:00
+
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_win_counters"
+down_revision: Union[str, Sequence[str], None] = "0003_base_summary_columns"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+battle_logs = sa.table(
+    "battle_logs",
+    sa.column("id", sa.Integer()),
+    sa.column("winner_id", sa.String()),
+    sa.column("timestamp", sa.DateTime()),
+)
+win_counters = sa.table(
+    "win_counters",
+    sa.column("username", sa.String()),
+    sa.column("period", sa.String()),
+    sa.column("wins", sa.Integer()),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if "win_counters" not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            "win_counters",
+            sa.Column("username", sa.String(), primary_key=True),
+            sa.Column("period", sa.String(), primary_key=True),
+            sa.Column("wins", sa.Integer(), nullable=False),
+        )
+        op.create_index("ix_win_counters_period_wins", "win_counters", ["period", "wins"])
+
+    if bind.execute(sa.select(win_counters.c.username).limit(1)).first() is not None:
+        return
+
+    rows = []
+    alltime = bind.execute(
+        sa.select(battle_logs.c.winner_id, sa.func.count(battle_logs.c.id))
+        .where(battle_logs.c.winner_id.isnot(None))
+        .group_by(battle_logs.c.winner_id)
+    ).all()
+    rows += [{"username": u, "period": "alltime", "wins": n} for u, n in alltime]
+
+    today = datetime.utcnow().date()
+    since = datetime.combine(today - timedelta(days=6), datetime.min.time())
+    daily = Counter(
+        (winner, ts.date().isoformat())
+        for winner, ts in bind.execute(
+            sa.select(battle_logs.c.winner_id, battle_logs.c.timestamp)
+            .where(battle_logs.c.timestamp >= since, battle_logs.c.winner_id.isnot(None))
+        )
+    )
+    rows += [{"username": u, "period": day, "wins": n} for (u, day), n in daily.items()]
+
+    if rows:
+        op.bulk_insert(win_counters, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("win_counters")
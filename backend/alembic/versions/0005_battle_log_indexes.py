@@ -0,0 +1,40 @@
+"""Composite indexes for battle_logs access patterns
+
+Revision ID: 0005_battle_log_indexes
+Revises: 0004_win_counters
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_battle_log_indexes"
+down_revision: Union[str, Sequence[str], None] = "0004_win_counters"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    "ix_battle_logs_attacker_defender_ts": ["attacker_id", "defender_id", "timestamp"],
+    "ix_battle_logs_defender_attacker_revenged": ["defender_id", "attacker_id", "is_revenged"],
+    "ix_battle_logs_attacker_ts": ["attacker_id", "timestamp"],
+    "ix_battle_logs_defender_ts": ["defender_id", "timestamp"],
+    "ix_battle_logs_winner_ts": ["winner_id", "timestamp"],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existing = {i["name"] for i in sa.inspect(op.get_bind()).get_indexes("battle_logs")}
+    for name, columns in INDEXES.items():
+        if name not in existing:
+            op.create_index(name, "battle_logs", columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in INDEXES:
+        op.drop_index(name, table_name="battle_logs")
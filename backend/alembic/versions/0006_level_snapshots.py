@@ -0,0 +1,131 @@
+"""Content-addressed level_snapshots; level copies become hash references
+
+bases.level, base_history.level, attack_sessions.frozen_level and
+battle_logs.level_snapshot are interned into `level_snapshots` and
+replaced by `*_hash` columns.
+
+Revision ID: 0006_level_snapshots
+Revises: 0005_battle_log_indexes
+Create Date: 2026-10-18 00:00:00
+
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_level_snapshots"
+down_revision: Union[str, Sequence[str], None] = "0005_battle_log_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, primary key, old JSON column, new hash column)
+REFERENCES = (
+    ("bases", "username", "level", "level_hash"),
+    ("base_history", "id", "level", "level_hash"),
+    ("attack_sessions", "id", "frozen_level", "frozen_level_hash"),
+    ("battle_logs", "id", "level_snapshot", "level_hash"),
+)
+BATCH = 5000
+
+level_snapshots = sa.table(
+    "level_snapshots",
+    sa.column("hash", sa.String()),
+    sa.column("level", sa.JSON()),
+    sa.column("created_at", sa.DateTime()),
+)
+
+
+def snapshot_hash(level):
+    # Must stay identical to app.snapshots.snapshot_hash
+    raw = json.dumps(level, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _rows(bind, table, pk, column):
+    """(pk, value) pairs, read in primary key order and in batches."""
+    last = None
+    while True:
+        query = sa.select(table.c[pk], table.c[column]).order_by(table.c[pk]).limit(BATCH)
+        if last is not None:
+            query = query.where(table.c[pk] > last)
+        rows = bind.execute(query).all()
+        if not rows:
+            return
+        yield from rows
+        last = rows[-1][0]
+
+
+def _intern_column(bind, known, table_name, pk, old, new):
+    table = sa.table(
+        table_name,
+        sa.column(pk),
+        sa.column(old, sa.JSON()),
+        sa.column(new, sa.String()),
+    )
+    now = datetime.utcnow()
+    for key, level in _rows(bind, table, pk, old):
+        if not level:
+            continue
+        digest = snapshot_hash(level)
+        if digest not in known:
+            bind.execute(level_snapshots.insert().values(hash=digest, level=level, created_at=now))
+            known.add(digest)
+        bind.execute(table.update().where(table.c[pk] == key).values({new: digest}))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if "level_snapshots" not in inspector.get_table_names():
+        op.create_table(
+            "level_snapshots",
+            sa.Column("hash", sa.String(64), primary_key=True),
+            sa.Column("level", sa.JSON(), nullable=False),
+            sa.Column("created_at", sa.DateTime()),
+        )
+    known = {r[0] for r in bind.execute(sa.select(level_snapshots.c.hash))}
+
+    for table_name, pk, old, new in REFERENCES:
+        columns = {c["name"] for c in inspector.get_columns(table_name)}
+        if old not in columns:
+            continue
+
+        with op.batch_alter_table(table_name) as batch:
+            batch.add_column(sa.Column(new, sa.String(64), nullable=True))
+        _intern_column(bind, known, table_name, pk, old, new)
+
+        with op.batch_alter_table(table_name) as batch:
+            batch.create_foreign_key(
+                f"fk_{table_name}_{new}_level_snapshots", "level_snapshots", [new], ["hash"]
+            )
+            batch.drop_column(old)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    for table_name, pk, old, new in REFERENCES:
+        with op.batch_alter_table(table_name) as batch:
+            batch.add_column(sa.Column(old, sa.JSON()))
+
+        table = sa.table(table_name, sa.column(pk), sa.column(old, sa.JSON()), sa.column(new, sa.String()))
+        for key, digest in _rows(bind, table, pk, new):
+            if digest:
+                level = bind.execute(
+                    sa.select(level_snapshots.c.level).where(level_snapshots.c.hash == digest)
+                ).scalar()
+                bind.execute(table.update().where(table.c[pk] == key).values({old: level}))
+
+        with op.batch_alter_table(table_name) as batch:
+            batch.drop_constraint(f"fk_{table_name}_{new}_level_snapshots", type_="foreignkey")
+            batch.drop_column(new)
+
+    op.drop_table("level_snapshots")
@@ -0,0 +1,94 @@
+"""Binary columns for battle_logs.replay_data and level_snapshots.level
+
+Existing JSON values are kept as UTF-8 JSON bytes, which app/codec.py
+reads through its JSON fallback; new rows are written packed. JSON 'null'
+replays become SQL NULL.
+
+Revision ID: 0007_packed_blobs
+Revises: 0006_level_snapshots
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.codec import decode_level, decode_programs
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007_packed_blobs"
+down_revision: Union[str, Sequence[str], None] = "0006_level_snapshots"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, primary key, column, nullable, decoder)
+COLUMNS = (
+    ("battle_logs", "id", "replay_data", True, decode_programs),
+    ("level_snapshots", "hash", "level", False, decode_level),
+)
+BATCH = 5000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    for table_name, pk, column, nullable, _ in COLUMNS:
+        types = {c["name"]: c["type"] for c in inspector.get_columns(table_name)}
+        if isinstance(types[column], sa.LargeBinary):
+            continue
+
+        table = sa.table(table_name, sa.column(column, sa.JSON()))
+        bind.execute(
+            table.update()
+            .where(sa.cast(table.c[column], sa.Text) == "null")
+            .values({column: sa.null()})
+        )
+        with op.batch_alter_table(table_name) as batch:
+            batch.alter_column(
+                column,
+                type_=sa.LargeBinary(),
+                existing_type=sa.JSON(),
+                existing_nullable=nullable,
+                postgresql_using=f"convert_to({column}::text, 'UTF8')",
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    for table_name, pk, column, nullable, decode in COLUMNS:
+        # Decoded into a fresh JSON column: no database can cast the packed bytes
+        staging = f"{column}_json"
+        with op.batch_alter_table(table_name) as batch:
+            batch.add_column(sa.Column(staging, sa.JSON()))
+
+        table = sa.table(
+            table_name,
+            sa.column(pk),
+            sa.column(column, sa.LargeBinary()),
+            sa.column(staging, sa.JSON()),
+        )
+        last = None
+        while True:
+            query = (
+                sa.select(table.c[pk], table.c[column])
+                .where(table.c[column].isnot(None))
+                .order_by(table.c[pk])
+                .limit(BATCH)
+            )
+            if last is not None:
+                query = query.where(table.c[pk] > last)
+            rows = bind.execute(query).all()
+            if not rows:
+                break
+            for key, data in rows:
+                bind.execute(table.update().where(table.c[pk] == key).values({staging: decode(data)}))
+            last = rows[-1][0]
+
+        with op.batch_alter_table(table_name) as batch:
+            batch.drop_column(column)
+            batch.alter_column(staging, new_column_name=column, existing_type=sa.JSON(), nullable=nullable)
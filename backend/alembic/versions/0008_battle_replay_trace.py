@@ -0,0 +1,32 @@
+"""Packed step trace of each battle replay
+
+Revision ID: 0008_battle_replay_trace
+Revises: 0007_packed_blobs
+Create Date: 2026-10-18 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008_battle_replay_trace"
+down_revision: Union[str, Sequence[str], None] = "0007_packed_blobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("battle_logs")}
+    if "replay_trace" not in columns:
+        with op.batch_alter_table("battle_logs") as batch:
+            batch.add_column(sa.Column("replay_trace", sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("battle_logs") as batch:
+        batch.drop_column("replay_trace")
@@ -0,0 +1,304 @@
+"""
+Compact binary encoding for stored replays and level snapshots.
+
+Programs (format v1):
+    0x01, then per panel: key index, slot count, slots packed two per byte
+    as 4-bit opcodes (PROGRAM_OPS; 0 = empty slot, high nibble first).
+
+Levels (format v1):
+    0x01, flags, gridSize, [start x, y, dir], gridSize² height bytes,
+    [goal bitset], [ice bitset], then the remaining fields as compact JSON.
+    Bitsets are little-endian over the row-major cell index.
+
+Traces (format v1):
+    0x01, then each packed trace record (app/simulator.py, TRACE_STEP)
+    as an unsigned LEB128 varint; most records fit in one or two bytes.
+
+Only values that decode back to exactly the same structure are packed:
+start/goals/iceTiles outside the canonical shape (extra keys, unsorted or
+duplicate tiles, out-of-grid cells) go to the JSON tail, and a level or
+program that can't be packed at all is stored as plain JSON text. The
+version byte is below 0x20, which no JSON document starts with, so the
+readers accept legacy JSON rows as well.
+"""
+import json
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+FORMAT_V1 = 0x01
+
+PROGRAM_KEYS = ("main", "m1", "m2", "p1", "p2")
+PROGRAM_OPS = (None, "F", "J", "TL", "TR", "L", "M1", "M2")
+_OP_CODES = {op: code for code, op in enumerate(PROGRAM_OPS)}
+_KEY_CODES = {key: code for code, key in enumerate(PROGRAM_KEYS)}
+
+# Level flags: which fields are in the binary part
+PACKED_START = 0x01
+PACKED_GOALS = 0x02
+PACKED_ICE = 0x04
+
+
+def _to_json(value) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def _from_json(data):
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode()
+    return json.loads(data)
+
+
+def _as_bytes(data):
+    # psycopg2 returns bytea as memoryview; legacy SQLite rows may be str
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return data
+
+
+def _is_binary(data) -> bool:
+    return isinstance(data, (bytes, bytearray)) and len(data) > 0 and data[0] < 0x20
+
+
+def _byte(value) -> bool:
+    return type(value) is int and 0 <= value <= 0xFF
+
+
+# -----------------------------
+# PROGRAMS
+# -----------------------------
+
+def _pack_programs(programs):
+    if not isinstance(programs, dict) or len(programs) > len(PROGRAM_KEYS):
+        return None
+
+    out = bytearray([FORMAT_V1])
+    for key, slots in programs.items():
+        if key not in _KEY_CODES or not isinstance(slots, list) or len(slots) > 0xFF:
+            return None
+        codes = []
+        for slot in slots:
+            # `None` is hashable, so a dict lookup covers every valid slot
+            code = _OP_CODES.get(slot) if isinstance(slot, (str, type(None))) else None
+            if code is None:
+                return None
+            codes.append(code)
+        if len(codes) % 2:
+            codes.append(0)
+
+        out.append(_KEY_CODES[key])
+        out.append(len(slots))
+        out.extend((codes[i] << 4) | codes[i + 1] for i in range(0, len(codes), 2))
+    return bytes(out)
+
+
+def encode_programs(programs) -> bytes:
+    """Binary v1 when every slot is a known command, JSON text otherwise."""
+    packed = _pack_programs(programs)
+    return packed if packed is not None else _to_json(programs)
+
+
+def decode_programs(data):
+    """Inverse of `encode_programs`; also reads plain JSON."""
+    data = _as_bytes(data)
+    if not _is_binary(data):
+        return _from_json(data)
+    if data[0] != FORMAT_V1:
+        raise ValueError(f"Unknown programs format {data[0]}")
+
+    programs = {}
+    pos = 1
+    while pos < len(data):
+        key, count = PROGRAM_KEYS[data[pos]], data[pos + 1]
+        pos += 2
+        body = data[pos:pos + (count + 1) // 2]
+        pos += len(body)
+        slots = []
+        for byte in body:
+            slots.append(PROGRAM_OPS[byte >> 4])
+            slots.append(PROGRAM_OPS[byte & 0x0F])
+        programs[key] = slots[:count]
+    return programs
+
+
+# -----------------------------
+# LEVELS
+# -----------------------------
+
+def _tile_bits(tiles, size):
+    """Bitset of a tile list, or None unless it's unique, in-grid and row-major sorted."""
+    if not isinstance(tiles, list):
+        return None
+    bits = 0
+    last = -1
+    for tile in tiles:
+        if not isinstance(tile, dict) or tile.keys() != {"x", "y"}:
+            return None
+        x, y = tile["x"], tile["y"]
+        if type(x) is not int or type(y) is not int or not (0 <= x < size and 0 <= y < size):
+            return None
+        cell = y * size + x
+        if cell <= last:
+            return None
+        last = cell
+        bits |= 1 << cell
+    return bits
+
+
+def _bits_tiles(bits, size):
+    tiles = []
+    while bits:
+        low = bits & -bits
+        cell = low.bit_length() - 1
+        tiles.append({"x": cell % size, "y": cell // size})
+        bits ^= low
+    return tiles
+
+
+def _pack_level(level):
+    if not isinstance(level, dict):
+        return None
+    size = level.get("gridSize")
+    heights = level.get("heights")
+    if not _byte(size) or size == 0 or not isinstance(heights, list) or len(heights) != size:
+        return None
+    flat = []
+    for row in heights:
+        if not isinstance(row, list) or len(row) != size or not all(_byte(h) for h in row):
+            return None
+        flat.extend(row)
+
+    rest = {k: v for k, v in level.items() if k not in ("gridSize", "heights")}
+    flags = 0
+    head = bytearray()
+
+    start = rest.get("start")
+    if (
+        isinstance(start, dict) and start.keys() == {"x", "y", "dir"}
+        and all(_byte(start[k]) for k in ("x", "y", "dir"))
+    ):
+        flags |= PACKED_START
+        head.extend((start["x"], start["y"], start["dir"]))
+        del rest["start"]
+
+    bitset_len = (size * size + 7) // 8
+    tail = bytearray()
+    for key, flag in (("goals", PACKED_GOALS), ("iceTiles", PACKED_ICE)):
+        bits = _tile_bits(rest.get(key), size)
+        if bits is not None:
+            flags |= flag
+            tail.extend(bits.to_bytes(bitset_len, "little"))
+            del rest[key]
+
+    return (
+        bytes((FORMAT_V1, flags, size)) + bytes(head) + bytes(flat) + bytes(tail)
+        + (_to_json(rest) if rest else b"")
+    )
+
+
+def encode_level(level) -> bytes:
+    """Binary v1 for a square grid of 0..255 heights, JSON text otherwise."""
+    packed = _pack_level(level)
+    return packed if packed is not None else _to_json(level)
+
+
+def decode_level(data):
+    """Inverse of `encode_level`; also reads plain JSON."""
+    data = _as_bytes(data)
+    if not _is_binary(data):
+        return _from_json(data)
+    if data[0] != FORMAT_V1:
+        raise ValueError(f"Unknown level format {data[0]}")
+
+    flags, size = data[1], data[2]
+    pos = 3
+    level = {"gridSize": size}
+    if flags & PACKED_START:
+        level["start"] = {"x": data[pos], "y": data[pos + 1], "dir": data[pos + 2]}
+        pos += 3
+    level["heights"] = [list(data[pos + y * size:pos + (y + 1) * size]) for y in range(size)]
+    pos += size * size
+
+    bitset_len = (size * size + 7) // 8
+    for key, flag in (("goals", PACKED_GOALS), ("iceTiles", PACKED_ICE)):
+        if flags & flag:
+            bits = int.from_bytes(data[pos:pos + bitset_len], "little")
+            level[key] = _bits_tiles(bits, size)
+            pos += bitset_len
+
+    if pos < len(data):
+        level.update(_from_json(data[pos:]))
+    return level
+
+
+# -----------------------------
+# TRACES
+# -----------------------------
+
+def encode_trace(records) -> bytes:
+    """Packed trace records (non-negative ints) as LEB128 varints."""
+    out = bytearray([FORMAT_V1])
+    for record in records:
+        while record > 0x7F:
+            out.append((record & 0x7F) | 0x80)
+            record >>= 7
+        out.append(record)
+    return bytes(out)
+
+
+def decode_trace(data):
+    """Inverse of `encode_trace`."""
+    data = _as_bytes(data)
+    if not data or data[0] != FORMAT_V1:
+        raise ValueError("Unknown trace format")
+
+    records = []
+    value = shift = 0
+    for byte in data[1:]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            records.append(value)
+            value = shift = 0
+    return records
+
+
+# -----------------------------
+# COLUMN TYPES
+# -----------------------------
+
+class PackedPrograms(TypeDecorator):
+    """Programs dict stored with `encode_programs` (None stays SQL NULL)."""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else encode_programs(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else decode_programs(value)
+
+
+class PackedLevel(TypeDecorator):
+    """Level dict stored with `encode_level` (None stays SQL NULL)."""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else encode_level(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else decode_level(value)
+
+
+class PackedTrace(TypeDecorator):
+    """Trace record list stored with `encode_trace` (None stays SQL NULL)."""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else encode_trace(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else decode_trace(value)
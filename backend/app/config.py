@@ -3,17 +3,86 @@ from fastapi.security import OAuth2PasswordBearer
 import os
 from dotenv import load_dotenv
 
+load_dotenv()
+
 # SECURITY CONFIG
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+# Google ID token signing certs (see app/google_auth.py); a local
+# {kid: x509 PEM} JSON file replaces the endpoint, e.g. for offline tests
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+GOOGLE_CERTS_FILE = os.getenv("GOOGLE_CERTS_FILE")
 
 # SECURITY TOOLS
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt work factor; hashes made with another factor are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+# Dedicated thread pool for password hashing (see app/password_hasher.py)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 2))))
+PASSWORD_HASH_QUEUE_DEPTH = int(os.getenv("PASSWORD_HASH_QUEUE_DEPTH", "32"))
+# Seconds between password hashing stats lines in the log (0 = only at shutdown)
+PASSWORD_HASH_STATS_INTERVAL = float(os.getenv("PASSWORD_HASH_STATS_INTERVAL", "300"))
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 MAX_LIVES = 5
+# Largest accepted level (the editor offers 6, 8 and 10)
+MAX_GRID_SIZE = 16
+
+# ARENA REWARDS (computed server-side from the verified replay)
+ARENA_BASE_WIN_POINTS = 500
+ARENA_POINTS_PER_SECOND_LEFT = 10
+ARENA_BASE_COIN_REWARD = 50
+
+# DATABASE (engine settings, see app/database.py)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Seconds before a pooled connection is replaced (-1 = never)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+# Build missing tables from the models at startup (tests / throwaway dev
+# databases only; real databases are migrated with `alembic upgrade head`)
+DB_CREATE_ALL = os.getenv("DB_CREATE_ALL", "0") == "1"
+# SQLite only: WAL journal (readers don't block the writer) and how long a
+# writer waits for the lock before "database is locked"
+SQLITE_WAL = os.getenv("SQLITE_WAL", "1") == "1"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# AUTH CACHES (see app/auth.py and app/user_context.py)
+# Verified tokens are trusted for this long (never past their own expiry)
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Writes through this process invalidate a user's context right away; the TTL
+# bounds how stale it can get when another worker process wrote it
+USER_CONTEXT_TTL = float(os.getenv("USER_CONTEXT_TTL", "10"))
+USER_CONTEXT_CACHE_SIZE = int(os.getenv("USER_CONTEXT_CACHE_SIZE", "10000"))
+
+# SIMULATION
+MAX_BATCH_SIZE = 1000
+# Dedicated process pool for simulations (see app/sim_executor.py)
+SIM_POOL_SIZE = int(os.getenv("SIM_POOL_SIZE", str(os.cpu_count() or 2)))
+SIM_QUEUE_DEPTH = int(os.getenv("SIM_QUEUE_DEPTH", "32"))
+SIM_JOB_TIMEOUT = float(os.getenv("SIM_JOB_TIMEOUT", "10"))
+# Budgets for the background solver run on every base submit (app/solver.py)
+SOLVER_NODE_BUDGET = int(os.getenv("SOLVER_NODE_BUDGET", "200000"))
+SOLVER_TIME_BUDGET = float(os.getenv("SOLVER_TIME_BUDGET", "2"))
+# Separate low-priority pool for those solver runs (never shares sim slots)
+ANALYSIS_POOL_SIZE = int(os.getenv("ANALYSIS_POOL_SIZE", "1"))
+ANALYSIS_QUEUE_DEPTH = int(os.getenv("ANALYSIS_QUEUE_DEPTH", "4"))
+ANALYSIS_NICENESS = int(os.getenv("ANALYSIS_NICENESS", "10"))
+
+# MATCHMAKING (see app/matchmaking.py)
+MATCHMAKING_POOL_SIZE = 50
+# Opponents are drawn from +/- this many trophies; the band doubles
+# until enough bases are found or it reaches the max
+MATCHMAKING_TROPHY_BAND = int(os.getenv("MATCHMAKING_TROPHY_BAND", "200"))
+MATCHMAKING_MAX_BAND = int(os.getenv("MATCHMAKING_MAX_BAND", "3200"))
+
+# LEADERBOARD (see app/leaderboard.py)
+LEADERBOARD_CACHE_TTL = float(os.getenv("LEADERBOARD_CACHE_TTL", "10"))
 
 # GAME DEFAULTS
 # Default configuration for a 6x6 empty base
@@ -1,8 +1,15 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 
+from app.config import (
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_ECHO,
+    SQLITE_WAL, SQLITE_BUSY_TIMEOUT_MS,
+)
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -10,16 +17,85 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set in environment variables")
 
-# SQLite needs special args
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
+# Async drivers for the same database (aiosqlite locally, asyncpg in production)
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args=connect_args,
-    echo=False
-)
+
+def async_url(url: str) -> str:
+    """`url` with its driver swapped for the async one (ASYNC_DRIVERS)."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_url(DATABASE_URL)
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and (
+        parsed.database in (None, "", ":memory:") or "mode=memory" in url
+    )
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        if SQLITE_WAL:
+            # Persistent per file; readers no longer block the writer
+            cursor.execute("PRAGMA journal_mode=WAL")
+            # Safe with WAL: only the last commits may be lost on power loss
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    finally:
+        cursor.close()
+
+
+def _engine_options(url: str, overrides: dict) -> dict:
+    options = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING}
+
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite needs special args
+        options["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+    if not _is_memory_sqlite(url):
+        # In-memory SQLite uses a single-connection pool without sizing
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+    options.update(overrides)
+    return options
+
+
+def make_engine(url: str = DATABASE_URL, **overrides):
+    """
+    Engine with the pool settings from app/config.py (DB_POOL_*).
+    SQLite connections additionally get WAL, synchronous=NORMAL and a
+    busy timeout on connect. `overrides` go straight to create_engine.
+    """
+    engine = create_engine(url, **_engine_options(url, overrides))
+    if engine.dialect.name == "sqlite" and not _is_memory_sqlite(url):
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+def make_async_engine(url: str = ASYNC_DATABASE_URL, **overrides):
+    """`make_engine` for an async driver (same pool settings and SQLite pragmas)."""
+    engine = create_async_engine(url, **_engine_options(url, overrides))
+    if engine.dialect.name == "sqlite" and not _is_memory_sqlite(url):
+        event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+engine = make_engine()
+async_engine = make_async_engine()
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -27,6 +103,15 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+# Async sessions hold no thread while waiting on the database. Sync
+# helpers can still run on them through `await db.run_sync(fn, ...)`.
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
@@ -36,3 +121,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,147 @@
+"""
+Google ID token verification with a local key store.
+
+`id_token.verify_oauth2_token` downloads Google's signing certificates on
+every call. Here the certificates come from a key source that keeps them
+in memory:
+
+- `HttpCertSource` fetches them over a pooled HTTP session and keeps them
+  until the response's Cache-Control max-age (or Expires) runs out; a
+  token signed by an unknown key id triggers one early refresh, for key
+  rotations.
+- `FileCertSource` reads a local {kid: x509 PEM} JSON file, so tests and
+  offline setups can sign tokens with their own stand-in keys
+  (GOOGLE_CERTS_FILE).
+
+Signature, expiry, audience and issuer checks are the ones
+`verify_oauth2_token` performs (google.auth.jwt.decode).
+"""
+import email.utils
+import json
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from google.auth import exceptions, jwt
+
+from app.config import GOOGLE_CLIENT_ID, GOOGLE_CERTS_URL, GOOGLE_CERTS_FILE
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+# Used when the certs response carries no usable cache headers
+DEFAULT_CERTS_MAX_AGE = 300
+# Unknown key ids refresh the certs at most this often (seconds)
+MIN_REFRESH_INTERVAL = 30
+HTTP_TIMEOUT = 5
+HTTP_POOL_SIZE = 4
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+def _cache_lifetime(headers) -> float:
+    """Seconds the response may be cached, from Cache-Control/Age or Expires."""
+    cache_control = headers.get("Cache-Control", "")
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        return max(0, int(match.group(1)) - int(headers.get("Age", 0) or 0))
+
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            return max(0, email.utils.parsedate_to_datetime(expires).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return DEFAULT_CERTS_MAX_AGE
+
+
+class HttpCertSource:
+    """Google's certificate endpoint, cached as its headers allow."""
+
+    def __init__(self, url: str, session: requests.Session = None):
+        self.url = url
+        self.session = session or self._pooled_session()
+        self._certs = None
+        self._expires_at = 0
+        self._fetched_at = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _pooled_session():
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _fetch(self):
+        response = self.session.get(self.url, timeout=HTTP_TIMEOUT)
+        if response.status_code != 200:
+            raise exceptions.TransportError(f"Could not fetch certificates at {self.url}")
+        now = time.monotonic()
+        self._certs = response.json()
+        self._fetched_at = now
+        self._expires_at = now + _cache_lifetime(response.headers)
+
+    def certs(self, refresh: bool = False) -> dict:
+        """{kid: PEM}. `refresh` asks for a re-fetch (rate limited), e.g. for an unknown kid."""
+        with self._lock:
+            now = time.monotonic()
+            stale = self._certs is None or now >= self._expires_at
+            if refresh and now - self._fetched_at >= MIN_REFRESH_INTERVAL:
+                stale = True
+            if stale:
+                # One fetch for all waiting logins
+                self._fetch()
+            return self._certs
+
+
+class FileCertSource:
+    """Static {kid: PEM} certificates from a local JSON file (or dict)."""
+
+    def __init__(self, path: str = None, certs: dict = None):
+        if certs is None:
+            with open(path) as f:
+                certs = json.load(f)
+        self._certs = certs
+
+    def certs(self, refresh: bool = False) -> dict:
+        return self._certs
+
+
+class GoogleTokenVerifier:
+    def __init__(self, key_source, audience):
+        self.key_source = key_source
+        self.audience = audience
+
+    def verify(self, token) -> dict:
+        """
+        Decoded claims of a valid Google ID token.
+        Raises ValueError / GoogleAuthError like `verify_oauth2_token`.
+        """
+        if isinstance(token, bytes):
+            token = token.decode("utf-8")
+
+        certs = self.key_source.certs()
+        kid = jwt.decode_header(token).get("kid")
+        if kid and kid not in certs:
+            certs = self.key_source.certs(refresh=True)
+
+        idinfo = jwt.decode(token, certs=certs, audience=self.audience)
+        if idinfo.get("iss") not in GOOGLE_ISSUERS:
+            raise exceptions.GoogleAuthError(
+                f"Wrong issuer. 'iss' should be one of the following: {GOOGLE_ISSUERS}"
+            )
+        return idinfo
+
+
+def _default_key_source():
+    if GOOGLE_CERTS_FILE:
+        return FileCertSource(GOOGLE_CERTS_FILE)
+    return HttpCertSource(GOOGLE_CERTS_URL)
+
+
+google_verifier = GoogleTokenVerifier(_default_key_source(), GOOGLE_CLIENT_ID)
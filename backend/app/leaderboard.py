@@ -0,0 +1,134 @@
+"""
+Incrementally maintained leaderboard.
+
+`record_win` bumps the winner's "alltime" counter and today's counter
+in the same transaction that logs the battle, so standings never scan
+battle_logs. Daily/alltime are one indexed lookup per period, weekly sums
+at most 7 rows per user. Responses are cached for LEADERBOARD_CACHE_TTL
+seconds per period. Reads never write: expired day rows are pruned by
+`record_win` (per user, on their first win of a day) and at startup.
+"""
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import desc, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.sql_models import User, WinCounter
+from app.config import LEADERBOARD_CACHE_TTL
+
+ALLTIME = "alltime"
+PERIODS = ("daily", "weekly", "alltime")
+WEEK_DAYS = 7
+TOP_N = 10
+
+
+def _bump(db: Session, username: str, period: str) -> bool:
+    """Adds a win to the counter row; True if the row had to be created."""
+    updated = db.query(WinCounter).filter(
+        WinCounter.username == username,
+        WinCounter.period == period
+    ).update({WinCounter.wins: WinCounter.wins + 1}, synchronize_session=False)
+    if updated:
+        return False
+
+    try:
+        with db.begin_nested():
+            db.add(WinCounter(username=username, period=period, wins=1))
+        return True
+    except IntegrityError:
+        # A concurrent report created the row first
+        db.query(WinCounter).filter(
+            WinCounter.username == username,
+            WinCounter.period == period
+        ).update({WinCounter.wins: WinCounter.wins + 1}, synchronize_session=False)
+        return False
+
+
+def record_win(db: Session, username: str, when: datetime):
+    """Counts one win for `username` (caller commits together with the BattleLog)."""
+    _bump(db, username, ALLTIME)
+    if _bump(db, username, when.date().isoformat()):
+        # First win of the day: the user's older day rows may have expired
+        prune_daily_counters(db, when.date(), username)
+
+
+def prune_daily_counters(db: Session, today: date, username: str = None) -> int:
+    """
+    Drops day rows that fell out of the weekly window (only `username`'s
+    if given). Caller commits; run for everyone at startup.
+    """
+    cutoff = (today - timedelta(days=WEEK_DAYS - 1)).isoformat()
+    query = db.query(WinCounter).filter(
+        WinCounter.period != ALLTIME,
+        WinCounter.period < cutoff
+    )
+    if username is not None:
+        query = query.filter(WinCounter.username == username)
+    return query.delete(synchronize_session=False)
+
+
+def _top(db: Session, period: str, today: date):
+    if period == "weekly":
+        days = [(today - timedelta(days=i)).isoformat() for i in range(WEEK_DAYS)]
+        period_filter = WinCounter.period.in_(days)
+    else:
+        period_filter = WinCounter.period == (today.isoformat() if period == "daily" else ALLTIME)
+
+    wins = func.sum(WinCounter.wins).label("wins")
+    rows = (
+        db.query(User.username, wins, User.trophies)
+        .join(WinCounter, WinCounter.username == User.username)
+        .filter(period_filter)
+        .group_by(User.username, User.trophies)
+        .order_by(desc(wins), desc(User.trophies))
+        .limit(TOP_N)
+        .all()
+    )
+    return [
+        {"username": r.username, "wins": int(r.wins), "trophies": r.trophies}
+        for r in rows
+    ]
+
+
+class _ResponseCache:
+    """Per-period TTL cache of leaderboard responses."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+leaderboard_cache = _ResponseCache(LEADERBOARD_CACHE_TTL)
+
+
+def leaderboard_standings(db: Session, period: str):
+    """Top players for `period` ("daily", "weekly" or "alltime"); read-only."""
+    today = datetime.utcnow().date()
+    key = (period, today)
+    cached = leaderboard_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # Expired day rows are never selected: `_top` filters on the window
+    result = _top(db, period, today)
+    leaderboard_cache.put(key, result)
+    return result
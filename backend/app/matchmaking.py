@@ -0,0 +1,78 @@
+"""
+Opponent matchmaking over the denormalized `deployed_bases` table.
+
+Every write that changes a user's base, trophies or experience calls
+`sync_deployed_base` before committing, so listing opponents is a single
+indexed range scan on trophies and never touches the User JSON blobs.
+"""
+import random
+
+from sqlalchemy.orm import Session
+
+from app.sql_models import User, DeployedBase
+from app.config import MATCHMAKING_POOL_SIZE, MATCHMAKING_TROPHY_BAND, MATCHMAKING_MAX_BAND
+from app.routers.levels import get_level_from_exp
+
+
+def sync_deployed_base(db: Session, user: User):
+    """Upserts the user's summary row (or drops it if no base is deployed). Caller commits."""
+    base = user.active_base
+    row = db.get(DeployedBase, user.username)
+
+    if base is None:
+        if row is not None:
+            db.delete(row)
+        return
+
+    if row is None:
+        row = DeployedBase(username=user.username)
+        db.add(row)
+
+    row.trophies = user.trophies
+    row.level = get_level_from_exp(user.experience or 0)
+    # Summary columns of the bases row, the snapshot itself is never loaded
+    row.name = base.name or f"{user.username}'s Outpost"
+    row.grid_size = base.grid_size or 6
+    row.goal_count = base.goal_count or 0
+
+
+def backfill_deployed_bases(db: Session) -> int:
+    """Builds deployed_bases from users when the table is empty (first start after upgrade)."""
+    if db.query(DeployedBase.username).first() is not None:
+        return 0
+
+    count = 0
+    for user in db.query(User).yield_per(500):
+        sync_deployed_base(db, user)
+        count += 1
+    db.commit()
+    return count
+
+
+def find_opponents(db: Session, username: str, limit: int = MATCHMAKING_POOL_SIZE):
+    """
+    Up to `limit` deployed bases within a trophy band around the player,
+    starting at a random offset so repeated calls show different opponents.
+    """
+    trophies = db.query(User.trophies).filter(User.username == username).scalar()
+    if trophies is None:
+        trophies = 1000
+
+    band = MATCHMAKING_TROPHY_BAND
+    while True:
+        query = db.query(DeployedBase).filter(
+            DeployedBase.username != username,
+            DeployedBase.trophies.between(trophies - band, trophies + band),
+        )
+        total = query.count()
+        if total >= limit or band >= MATCHMAKING_MAX_BAND:
+            break
+        band *= 2
+
+    offset = random.randint(0, max(0, total - limit))
+    return (
+        query.order_by(DeployedBase.trophies, DeployedBase.username)
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
@@ -83,6 +83,10 @@ class BaseResponse(BaseSnapshot):
     pass
 
 
+class BatchSimulationPayload(BaseModel):
+    items: List[BaseSnapshot]
+
+
 # -----------------------------
 # AUTH / USER
 # -----------------------------
@@ -144,9 +148,11 @@ class LeaderboardEntry(BaseModel):
 class BattleReportPayload(BaseModel):
     """Data sent FROM Client TO Server after a battle"""
     targetUser: str
-    isWin: bool
-    score: int
-    coinsEarned: int
+    # Client's claim only; the server re-simulates replay_programs to decide
+    isWin: Optional[bool] = None
+    # Ignored: score and coins are computed by the server from the replay
+    score: Optional[int] = None
+    coinsEarned: Optional[int] = None
     
     # FIX: Make these Optional so the request doesn't fail if Frontend omits them
     experienceEarned: Optional[int] = 0  
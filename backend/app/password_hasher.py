@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from .config import (
+    pwd_context, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_DEPTH, PASSWORD_HASH_STATS_INTERVAL,
+)
+
+# Durations kept for the percentiles in `stats()`
+LATENCY_WINDOW = 1024
+
+
+class PasswordHasher:
+    """
+    Bounded thread pool for bcrypt.
+
+    bcrypt releases the GIL, so a few dedicated threads hash in parallel
+    without touching the FastAPI threadpool: a login storm queues here
+    instead of stalling every other route. At most `workers + queue_depth`
+    jobs are in flight; past that, callers get a 503.
+    """
+
+    def __init__(self, context, workers: int, queue_depth: int):
+        self.context = context
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_depth)
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._pool = None
+        self._lock = threading.Lock()
+
+        self._in_flight = 0
+        self._counts = {"hash": 0, "verify": 0, "failed": 0, "rehash": 0, "rejected": 0}
+        self._waits = deque(maxlen=LATENCY_WINDOW)
+        self._totals = deque(maxlen=LATENCY_WINDOW)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            return self._pool
+
+    async def _run(self, kind, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counts["rejected"] += 1
+            raise HTTPException(503, "Too many logins in progress, try again later")
+
+        queued = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+
+        def job():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                done = time.perf_counter()
+                with self._lock:
+                    self._in_flight -= 1
+                    self._counts[kind] += 1
+                    self._waits.append(started - queued)
+                    self._totals.append(done - queued)
+                self._slots.release()
+
+        try:
+            future = self._get_pool().submit(job)
+        except RuntimeError:
+            # Pool shut down (app stopping)
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+            raise HTTPException(503, "Server is shutting down")
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password)
+
+    async def verify(self, password: str, hashed: str):
+        """
+        (valid, new_hash): `new_hash` is set when the password is valid but
+        the stored hash uses another scheme or work factor.
+        """
+        valid, new_hash = await self._run("verify", self.context.verify_and_update, password, hashed)
+        with self._lock:
+            if not valid:
+                self._counts["failed"] += 1
+            elif new_hash:
+                self._counts["rehash"] += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        """Counters plus queue wait / total latency percentiles (ms) over the last jobs."""
+        def percentiles(values):
+            if not values:
+                return {"p50": None, "p99": None}
+            ordered = sorted(values)
+            pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+            return {"p50": pick(0.50), "p99": pick(0.99)}
+
+        with self._lock:
+            waits, totals = list(self._waits), list(self._totals)
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "rounds": self.context.handler("bcrypt").default_rounds,
+                "in_flight": self._in_flight,
+                **self._counts,
+                "wait_ms": percentiles(waits),
+                "total_ms": percentiles(totals),
+            }
+
+    def log_stats(self):
+        # Ops-only: login volume and failure counts are not for public routes
+        print(f"🔐 Password hashing: {self.stats()}")
+
+    async def log_stats_periodically(self, interval: float = PASSWORD_HASH_STATS_INTERVAL):
+        """Logs `stats()` every `interval` seconds while there was activity."""
+        last = None
+        while True:
+            await asyncio.sleep(interval)
+            with self._lock:
+                counts = dict(self._counts)
+            if counts != last:
+                self.log_stats()
+                last = counts
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+password_hasher = PasswordHasher(pwd_context, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_DEPTH)
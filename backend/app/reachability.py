@@ -0,0 +1,89 @@
+"""
+Reachability pre-check: which cells the robot can ever stand on.
+
+Movement never depends on which goals are lit, so the reachable set is a
+plain graph search over (cell, facing) from the start landing, with F/J
+moves resolved through the simulator's landing table (teleports,
+elevators and ice included). A goal outside that set can never be lit,
+whatever program is submitted, so such layouts are rejected before the
+full simulation runs.
+
+Results are cached per layout (same key as `compile_level_cached`), so
+re-checking an unchanged base is a dict lookup.
+"""
+import json
+from functools import lru_cache
+
+from .simulator import compile_level_cached, land, layout_key, layout_hash
+
+
+def _reachable_cells(lvl):
+    """Set of cells reachable from the start landing."""
+    start = land(lvl, lvl.start, 0)
+    seen = {(start, lvl.start_dir)}
+    stack = [(start, lvl.start_dir)]
+    cells = {start}
+
+    while stack:
+        pos, facing = stack.pop()
+        nexts = [(pos, (facing + 1) % 4), (pos, (facing + 3) % 4)]
+
+        nxt = lvl.neighbors[facing][pos]
+        h0 = lvl.heights[pos]
+        h1 = lvl.heights[nxt] if nxt >= 0 else None
+        # F walks on equal height, J climbs one or drops any amount
+        if h0 is not None and h1 is not None and h1 <= h0 + 1:
+            nexts.append((land(lvl, nxt, 1 + facing), facing))
+
+        for state in nexts:
+            if state not in seen:
+                seen.add(state)
+                cells.add(state[0])
+                stack.append(state)
+
+    return cells
+
+
+@lru_cache(maxsize=1024)
+def _analyze_layout(key):
+    level = json.loads(key)
+    lvl = compile_level_cached(level)
+    size = lvl.size
+
+    if lvl.start < 0:
+        # Reported by the simulator as INVALID_START
+        return size, frozenset(), ()
+
+    reachable = _reachable_cells(lvl)
+    unreachable_goals = tuple(
+        (g["x"], g["y"])
+        for g in level["goals"]
+        if not lvl.in_bounds(g["x"], g["y"]) or g["y"] * size + g["x"] not in reachable
+    )
+    return size, frozenset(reachable), unreachable_goals
+
+
+def analyze_reachability(level):
+    """
+    Reachability report for a raw level dict:
+    {"layoutHash", "reachable" (rows of bools, reachable[y][x]),
+     "unreachableGoals" ([{x, y}]), "solvable"}.
+
+    `solvable` is False when no program can light every goal; True only
+    means every goal can be stood on (slot limits are not considered).
+    """
+    size, reachable, unreachable_goals = _analyze_layout(layout_key(level))
+    return {
+        "layoutHash": layout_hash(level),
+        "reachable": [
+            [y * size + x in reachable for x in range(size)]
+            for y in range(size)
+        ],
+        "unreachableGoals": [{"x": x, "y": y} for x, y in unreachable_goals],
+        "solvable": bool(level.get("goals")) and bool(reachable) and not unreachable_goals,
+    }
+
+
+def unreachable_goals(level):
+    """Goals (as (x, y)) that no program can reach; empty when all are reachable."""
+    return list(_analyze_layout(layout_key(level))[2])
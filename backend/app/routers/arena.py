@@ -1,20 +1,30 @@
+import base64
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, or_, func
-from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy import desc, or_, and_, select, tuple_, union_all
 
-from app.database import get_db
-from app.sql_models import User, BattleLog
+from app.database import get_db, get_async_db
+from app.sql_models import User, BattleLog, AttackSession
 from app.auth import get_current_user
+from app.user_context import UserContext, get_current_user_context
 # Ensure these Pydantic models exist in your app.models
-from app.models import LeaderboardEntry, BattleReportPayload, ArenaTargetResponse
+from app.models import LeaderboardEntry, BattleReportPayload, ArenaTargetResponse, Programs
+from app.simulator import run_lightbot, compile_programs
+from app.matchmaking import find_opponents, sync_deployed_base
+from app.leaderboard import PERIODS, record_win, leaderboard_standings
+from app.snapshots import store_level
+from app.config import ARENA_BASE_WIN_POINTS, ARENA_POINTS_PER_SECOND_LEFT, ARENA_BASE_COIN_REWARD
 # --- UPDATED IMPORTS: Import the standalone helper functions ---
 from app.routers.levels import (
     get_level_from_exp, 
     calculate_attack_exp,
     check_daily_reset,      # NEW
+    current_lives,
     deduct_life,            # NEW
     handle_win_restoration  # NEW
 )
@@ -23,75 +33,56 @@ router = APIRouter(tags=["Arena"])
 
 # --- HELPERS ---
 
-def get_active_attack(user: User, target_username: str) -> Optional[dict]:
+def get_active_attack(db: Session, username: str, target_username: str) -> Optional[AttackSession]:
     """Finds an ongoing attack session against a specific target."""
-    attacks = user.active_attacks or []
-    for attack in attacks:
-        if attack.get("target_user") == target_username:
-            return attack
-    return None
+    return db.query(AttackSession).filter(
+        AttackSession.attacker_id == username,
+        AttackSession.target_user == target_username
+    ).first()
 
-def clear_active_attack(user: User, target_username: str):
+def clear_active_attack(db: Session, username: str, target_username: str):
     """Removes the attack session after battle ends."""
-    if user.active_attacks:
-        # Create a new list excluding the target to ensure clean state
-        updated_attacks = [
-            a for a in user.active_attacks 
-            if a.get("target_user") != target_username
-        ]
-        user.active_attacks = updated_attacks
-        # Notify SQLAlchemy that the JSON field has changed
-        flag_modified(user, "active_attacks")
+    db.query(AttackSession).filter(
+        AttackSession.attacker_id == username,
+        AttackSession.target_user == target_username
+    ).delete(synchronize_session=False)
 
 # --- ENDPOINTS ---
 
 @router.get("/user/arena/opponents")
-def get_arena_opponents(
+async def get_arena_opponents(
     current_user: str = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Fetch 50 random users who aren't me
-    potential_opponents = db.query(User).filter(User.username != current_user).limit(50).all()
-    
-    opponents = []
-    for u in potential_opponents:
-        base_snapshot = u.base
-        # Skip if user hasn't set up a base yet
-        if not base_snapshot or "level" not in base_snapshot:
-            continue
-        
-        level_data = base_snapshot["level"]
-        # Calculate Level based on experience
-        user_level = get_level_from_exp(u.experience)
-
-        opponents.append({
-            "id": u.username, 
-            "username": u.username,
-            "name": level_data.get("name", f"{u.username}'s Outpost"),
-            "gridSize": level_data.get("gridSize", 6),
-            "goals": level_data.get("goals", []),
-            "trophies": u.trophies,
-            "level": user_level
-        })
-    return opponents
+    # Trophy-band matchmaking over the deployed_bases summary table
+    opponents = await db.run_sync(find_opponents, current_user)
+    return [
+        {
+            "id": b.username,
+            "username": b.username,
+            "name": b.name,
+            "gridSize": b.grid_size,
+            "goalCount": b.goal_count,
+            "trophies": b.trophies,
+            "level": b.level
+        }
+        for b in opponents
+    ]
 
 @router.get("/user/arena/target/{target_id}", response_model=ArenaTargetResponse)
 def get_arena_target(
     target_id: str, 
     snapshotId: Optional[str] = None,
-    current_user: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    attacker: UserContext = Depends(get_current_user_context)
 ):
-    attacker = db.query(User).filter(User.username == current_user).first()
+    current_user = attacker.username
     target_user = db.query(User).filter(User.username == target_id).first()
     
-    if not attacker: raise HTTPException(404, "Attacker profile not found")
     if not target_user: raise HTTPException(404, "Target not found")
     
     # --- CHECK LIVES & DAILY RESET ---
-    # FIX: Call the helper function passing the user object
-    if check_daily_reset(attacker):
-        db.commit() # Save the reset if it happened
+    lives = current_lives(db, attacker)
 
     target_base = target_user.base
     if not target_base or "level" not in target_base:
@@ -100,7 +91,7 @@ def get_arena_target(
     target_level_data = target_base["level"]
 
     # Check for Existing Session
-    active_session = get_active_attack(attacker, target_id)
+    active_session = get_active_attack(db, current_user, target_id)
     
     now = datetime.utcnow()
     remaining_seconds = 0
@@ -108,16 +99,16 @@ def get_arena_target(
 
     if active_session:
         # --- RESUME EXISTING SESSION ---
-        expires_at = datetime.fromisoformat(active_session["expires_at"])
+        expires_at = active_session.expires_at
         remaining_seconds = max(0, int((expires_at - now).total_seconds()))
         
         # Use frozen level from session
-        level_to_play = active_session.get("frozen_level", target_level_data)
+        level_to_play = active_session.frozen_level or target_level_data
     else:
         # --- START NEW SESSION ---
         
         # ⛔ CRITICAL: Check Lives before starting new game
-        if attacker.lives <= 0:
+        if lives <= 0:
             raise HTTPException(403, "Out of Lives! Come back tomorrow or wait for reset.")
 
         level_to_play = target_level_data
@@ -128,20 +119,15 @@ def get_arena_target(
         time_limit_seconds = minutes_allowed * 60
         expires_at = now + timedelta(seconds=time_limit_seconds)
         
-        new_session = {
-            "target_user": target_id,
-            "started_at": now.isoformat(),
-            "expires_at": expires_at.isoformat(),
-            "snapshot_id": snapshotId,       
-            "frozen_level": level_to_play 
-        }
-        
-        # FIX: Safer list initialization and assignment for JSON columns
-        current_attacks = list(attacker.active_attacks) if attacker.active_attacks else []
-        current_attacks.append(new_session)
-        attacker.active_attacks = current_attacks
-        
-        flag_modified(attacker, "active_attacks") # Crucial for JSON columns
+        db.add(AttackSession(
+            attacker_id=current_user,
+            target_user=target_id,
+            started_at=now,
+            expires_at=expires_at,
+            snapshot_id=snapshotId,
+            # The served level is the deployed snapshot: share its hash
+            frozen_level_hash=target_user.active_base.level_hash
+        ))
         
         db.commit()
         
@@ -153,7 +139,7 @@ def get_arena_target(
     }
 
 @router.post("/user/arena/report")
-def report_battle(
+async def report_battle(
     payload: BattleReportPayload, 
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -162,6 +148,55 @@ def report_battle(
     print(f"\n[REPORT START] User: {current_user} vs Target: {payload.targetUser}")
     print(f"[REPORT CLAIM] Client says Win? {payload.isWin}")
 
+    # 0. VERIFY REPLAY: re-run the submitted programs against the frozen level
+    frozen_level = await run_in_threadpool(
+        _get_frozen_level, db, current_user, payload.targetUser
+    )
+    replay_success, replay_trace = _verify_replay(frozen_level, payload.replay_programs)
+    print(f"[REPORT VERIFY] Server replay says Win? {replay_success}")
+
+    return await run_in_threadpool(
+        _apply_battle_report, db, current_user, payload, replay_success, replay_trace
+    )
+
+
+def _get_frozen_level(db: Session, username: str, target_username: str) -> Optional[dict]:
+    """Level the attacker was actually served for this battle (None without a session)."""
+    active_session = get_active_attack(db, username, target_username)
+    frozen_level = active_session.frozen_level if active_session else None
+
+    if active_session and not frozen_level:
+        # Legacy sessions without a frozen copy: fall back to the live base
+        defender = db.query(User).filter(User.username == target_username).first()
+        if defender and defender.base:
+            frozen_level = defender.base.get("level")
+
+    # Don't hold a pooled connection (or a read snapshot) during verification
+    db.rollback()
+    return frozen_level
+
+
+def _verify_replay(level: Optional[dict], replay_programs: Optional[dict]):
+    """(server-side win?, packed step trace or None) for the submitted programs."""
+    if not level or not replay_programs:
+        return False, None
+
+    try:
+        programs = Programs(**replay_programs).dict(by_alias=False)
+    except ValidationError:
+        return False, None
+
+    # A single compiled run (a few milliseconds at most, capped by MAX_STEPS)
+    # stays in-process: a busy sim pool must never cost a finished battle.
+    # It is traced, so the battle log can store the replay's step trace.
+    result = run_lightbot(level, programs, trace=True)
+    return result["success"], result["trace"]
+
+
+def _apply_battle_report(
+    db: Session, current_user: str, payload: BattleReportPayload,
+    replay_success: bool, replay_trace: Optional[list] = None
+):
     attacker = db.query(User).filter(User.username == current_user).first()
     defender = db.query(User).filter(User.username == payload.targetUser).first()
 
@@ -173,42 +208,60 @@ def report_battle(
     check_daily_reset(attacker)
 
     # 1. RETRIEVE SESSION
-    active_session = get_active_attack(attacker, payload.targetUser)
+    active_session = get_active_attack(db, current_user, payload.targetUser)
     
     # --- DEBUG LOG ---
     if not active_session:
         print(f"❌ [FAIL] No active session found in DB for {current_user}")
     else:
-        print(f"✅ [OK] Session found. Expires at: {active_session['expires_at']}")
+        print(f"✅ [OK] Session found. Expires at: {active_session.expires_at}")
 
     # 2. VALIDATE TIME (With 15s Grace Period for Latency)
-    if payload.isWin:
+    # The outcome is the server-side replay result, never the client's claim
+    is_win = replay_success
+    if is_win:
         if not active_session:
             print("⚠️ Denying Win: No Active Session")
-            payload.isWin = False
+            is_win = False
         else:
-            expires_at = datetime.fromisoformat(active_session["expires_at"])
+            expires_at = active_session.expires_at
             # Add 15 seconds buffer for network lag/loading times
             if datetime.utcnow() > (expires_at + timedelta(seconds=15)):
                 print(f"⚠️ Denying Win: Time Expired! (Server: {datetime.utcnow()} > Limit: {expires_at})")
-                payload.isWin = False
+                is_win = False
             else:
                 print("✅ [OK] Time validation passed")
 
     # 3. CALCULATE REWARDS
+    # Server-side only: time left on the session, never the client's numbers
     earned_exp = 0
+    score = 0
+    coins_earned = 0
+    time_bonus = 0
+    if is_win:
+        seconds_left = max(0, int((active_session.expires_at - datetime.utcnow()).total_seconds()))
+        time_bonus = seconds_left * ARENA_POINTS_PER_SECOND_LEFT
+        score = ARENA_BASE_WIN_POINTS + time_bonus
+        coins_earned = ARENA_BASE_COIN_REWARD + score // 50
     
-    # Handle defender level safely
-    defender_current_level = defender.base.get("level", {}) if (defender and defender.base) else {}
-    final_snapshot = payload.level_snapshot or defender_current_level
+    # Prefer the level the attacker was really served over the client's copy,
+    # then the defender's current base (snapshots are stored by hash)
+    if active_session and active_session.frozen_level_hash:
+        final_snapshot_hash = active_session.frozen_level_hash
+    elif payload.level_snapshot:
+        final_snapshot_hash = store_level(db, payload.level_snapshot)
+    elif defender and defender.active_base:
+        final_snapshot_hash = defender.active_base.level_hash
+    else:
+        final_snapshot_hash = None
 
     # Determine Opponent Level (for EXP and Life Restoration)
     attacker_level = get_level_from_exp(attacker.experience)
     defender_level = get_level_from_exp(defender.experience) if defender else attacker_level
 
-    if payload.isWin:
+    if is_win:
         # Give Coins/Trophies
-        attacker.coins += payload.coinsEarned
+        attacker.coins += coins_earned
         attacker.trophies += 20
         attacker.wins += 1
 
@@ -260,16 +313,23 @@ def report_battle(
     log = BattleLog(
         attacker_id=attacker.username,
         defender_id=payload.targetUser,
-        winner_id=current_user if payload.isWin else payload.targetUser,
-        score=payload.score,
+        winner_id=current_user if is_win else payload.targetUser,
+        score=score,
         timestamp=datetime.utcnow(),
         replay_data=payload.replay_programs,
-        level_snapshot=final_snapshot,
+        replay_trace=replay_trace,
+        level_hash=final_snapshot_hash,
         is_revenged=False 
     )
     db.add(log)
+    record_win(db, log.winner_id, log.timestamp)
     
-    clear_active_attack(attacker, payload.targetUser)
+    clear_active_attack(db, current_user, payload.targetUser)
+
+    # Keep matchmaking summaries in line with the new trophies/levels
+    sync_deployed_base(db, attacker)
+    if defender:
+        sync_deployed_base(db, defender)
     db.commit()
 
     print(f"[RESULT] Final EXP awarded: {earned_exp}")
@@ -278,104 +338,153 @@ def report_battle(
         "status": "success",
         "new_coins": attacker.coins,
         "new_trophies": attacker.trophies,
-        "gained_exp": earned_exp if payload.isWin else 0,
+        "gained_exp": earned_exp if is_win else 0,
         "new_level": get_level_from_exp(attacker.experience),
-        "forced_loss": (not payload.isWin) and (active_session is not None),
+        # The server's verdict and rewards: the client displays these
+        "isWin": is_win,
+        "score": score,
+        "coins_earned": coins_earned,
+        "time_bonus": time_bonus,
+        "forced_loss": (not is_win) and (active_session is not None),
         
         # 🆕 Return updated lives so Frontend can update hearts
         "lives": attacker.lives,
         "max_lives": 5 
     }
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 100
+
+
+def _encode_cursor(timestamp: datetime, log_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{log_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(400, "Invalid cursor")
+
+
+def _history_page_query(username: str, limit: int, after: Optional[tuple]):
+    """
+    Newest-first (timestamp, id) keyset page of the user's battles: one
+    index range scan for attacks and one for defenses, merged by UNION ALL.
+    Only summary columns are selected, never the replay/snapshot blobs.
+    """
+    has_replay = BattleLog.replay_data.isnot(None).label("has_replay")
+
+    def side(condition):
+        query = select(
+            BattleLog.id,
+            BattleLog.timestamp,
+            BattleLog.attacker_id,
+            BattleLog.defender_id,
+            BattleLog.winner_id,
+            BattleLog.score,
+            BattleLog.is_revenged,
+            has_replay,
+        ).where(condition)
+        if after:
+            ts, log_id = after
+            query = query.where(tuple_(BattleLog.timestamp, BattleLog.id) < tuple_(ts, log_id))
+        query = query.order_by(desc(BattleLog.timestamp), desc(BattleLog.id)).limit(limit)
+        return select(query.subquery())
+
+    merged = union_all(
+        side(BattleLog.attacker_id == username),
+        side(and_(BattleLog.defender_id == username, BattleLog.attacker_id != username)),
+    ).subquery()
+
+    return (
+        select(merged)
+        .order_by(desc(merged.c.timestamp), desc(merged.c.id))
+        .limit(limit)
+    )
+
+
 @router.get("/user/arena/history")
 def get_battle_history(
+    cursor: Optional[str] = None,
+    limit: int = HISTORY_PAGE_SIZE,
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    # Query BattleLogs where user is Attacker OR Defender
-    # Order by newest first, limit 50
-    logs = db.query(BattleLog).filter(
-        or_(
-            BattleLog.attacker_id == current_user,
-            BattleLog.defender_id == current_user
-        )
-    ).order_by(desc(BattleLog.timestamp)).limit(50).all()
+    """
+    Battle summaries, newest first, `limit` per page. Pass the returned
+    `nextCursor` to get the next (older) page; replay and level bodies
+    come from /user/arena/history/{log_id}.
+    """
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    after = _decode_cursor(cursor) if cursor else None
+    rows = db.execute(_history_page_query(current_user, limit, after)).all()
 
     formatted_history = []
     
-    for log in logs:
+    for log in rows:
         is_attack = (log.attacker_id == current_user)
         opponent = log.defender_id if is_attack else log.attacker_id
         
         user_won = (log.winner_id == current_user)
         
         formatted_history.append({
+            "id": log.id,
             "type": "ATTACK" if is_attack else "DEFENSE",
             "opponent": opponent,
             "isWin": user_won,
             "score": log.score,
             "timestamp": log.timestamp.isoformat(),
-            "level_config": log.level_snapshot,
-            "replay_programs": log.replay_data,
+            "hasReplay": bool(log.has_replay),
             "revenged": log.is_revenged, 
         })
 
-    return formatted_history
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = _encode_cursor(rows[-1].timestamp, rows[-1].id)
 
-@router.get("/leaderboard")
-def get_leaderboard(
-    period: str = "alltime",
+    return {"items": formatted_history, "nextCursor": next_cursor}
+
+
+@router.get("/user/arena/history/{log_id}")
+def get_battle_replay(
+    log_id: int,
+    current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    now = datetime.utcnow()
-    start_time = None
-
-    # 1. Determine Start Time based on period
-    if period == "daily":
-        # From today 00:00 UTC
-        start_time = datetime.combine(now.date(), datetime.min.time())
-    elif period == "weekly":
-        # Last 7 days
-        start_time = now - timedelta(days=7)
-    elif period == "alltime":
-        # No start time limit
-        start_time = None
-    else:
-        return []
-
-    # 2. Build the Query using BattleLog for ACCURACY
-    # We join User & BattleLog to count actual wins recorded in history.
-    query = (
-        db.query(
-            User.username.label("username"),
-            func.count(BattleLog.id).label("wins"),
-            User.trophies.label("trophies")
+    """Replay programs, step trace and level snapshot of one battle the user took part in."""
+    log = db.query(BattleLog).filter(
+        BattleLog.id == log_id,
+        or_(
+            BattleLog.attacker_id == current_user,
+            BattleLog.defender_id == current_user
         )
-        .join(BattleLog, BattleLog.winner_id == User.username)
-    )
+    ).first()
 
-    # 3. Apply Time Filter (if applicable)
-    if start_time:
-        query = query.filter(BattleLog.timestamp >= start_time)
-
-    # 4. Group, Order, and Fetch
-    # Note: We group by username and trophies to satisfy SQL standards
-    leaderboard = (
-        query
-        .group_by(User.username, User.trophies)
-        .order_by(
-            desc("wins"),           # Most wins in this period
-            desc(User.trophies)     # Tie-breaker: most trophies
-        )
-        .limit(10)
-        .all()
-    )
+    if not log:
+        raise HTTPException(404, "Battle not found")
 
-    return [
-        {
-            "username": row.username,
-            "wins": row.wins,
-            "trophies": row.trophies,
-        }
-        for row in leaderboard
-    ]
\ No newline at end of file
+    response = {
+        "id": log.id,
+        "level_config": log.level_snapshot,
+        "replay_programs": log.replay_data,
+        # Server-side step trace (format next to TRACE_STEP in app/simulator.py)
+        "replay_trace": log.replay_trace,
+    }
+    if log.replay_trace is not None and log.replay_data:
+        # Maps TRACE_STEP addresses back to (panel, slot), as /simulate/trace does
+        response["trace_addresses"] = compile_programs(log.replay_data).addresses
+    return response
+
+@router.get("/leaderboard")
+async def get_leaderboard(
+    period: str = "alltime",
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Served from incrementally maintained win counters (app/leaderboard.py)
+    if period not in PERIODS:
+        return []
+
+    return await db.run_sync(leaderboard_standings, period)
\ No newline at end of file
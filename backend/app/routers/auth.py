@@ -1,30 +1,53 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from google.oauth2 import id_token
-from google.auth.transport import requests
 from datetime import date
 
 from app.models import UserCreate, Token
 from app.database import get_db
 from app.sql_models import User
-from app.config import GOOGLE_CLIENT_ID, DEFAULT_BASE, MAX_LIVES
+from app.config import DEFAULT_BASE, MAX_LIVES
 from app.auth import get_password_hash, verify_password, create_access_token
 from app.routers.levels import check_daily_reset
+from app.matchmaking import sync_deployed_base
+from app.google_auth import google_verifier
 
 router = APIRouter(tags=["Authentication"])
 
+def _username_taken(db: Session, username: str) -> bool:
+    return db.query(User.username).filter(User.username == username).first() is not None
+
+
+def _find_credentials(db: Session, username: str):
+    """(username, password, auth_provider) or None; returns the connection before bcrypt runs"""
+    try:
+        return db.query(User.username, User.password, User.auth_provider).filter(
+            User.username == username
+        ).first()
+    finally:
+        db.rollback()
+
+
 @router.post("/register")
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    # Check existing
-    existing = db.query(User).filter(User.username == user.username).first()
-    if existing:
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    # Check existing before paying for a bcrypt hash
+    if await run_in_threadpool(_find_credentials, db, user.username):
+        raise HTTPException(400, "Username already exists")
+
+    hashed = await get_password_hash(user.password)
+    await run_in_threadpool(_create_user, db, user.username, hashed)
+    return {"message": "User registered"}
+
+
+def _create_user(db: Session, username: str, hashed: str):
+    # Re-checked: another registration may have won while we were hashing
+    if _username_taken(db, username):
         raise HTTPException(400, "Username already exists")
 
     new_user = User(
-        username=user.username,
-        password=get_password_hash(user.password),
-        base=DEFAULT_BASE,
+        username=username,
+        password=hashed,
         # SQL Defaults handle coins/trophies, but being explicit is safe:
         tutorial_progress=1,
         coins=0,
@@ -36,12 +59,14 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         last_lives_reset=date.today()
     )
     db.add(new_user)
+    new_user.base = DEFAULT_BASE
+    sync_deployed_base(db, new_user)
     db.commit()
-    return {"message": "User registered"}
+
 
 @router.post("/token", response_model=Token)
-def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form.username).first()
+async def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await run_in_threadpool(_find_credentials, db, form.username)
 
     if not user:
         raise HTTPException(401, "Incorrect username or password")
@@ -49,17 +74,32 @@ def login(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get
     if user.auth_provider == "google":
         raise HTTPException(400, "Use Google login")
 
-    if not verify_password(form.password, user.password):
+    valid, new_hash = await verify_password(form.password, user.password)
+    if not valid:
         raise HTTPException(401, "Incorrect username or password")
 
-    # --- NEW: Check Daily Reset on Login ---
-    # FIX: Call the helper function passing the user object
-    if check_daily_reset(user): 
-        db.commit() # Commit the reset if it happened
+    await run_in_threadpool(_finish_login, db, user.username, new_hash)
 
     token = create_access_token({"sub": user.username})
     return {"access_token": token, "token_type": "bearer"}
 
+
+def _finish_login(db: Session, username: str, new_hash):
+    user = db.query(User).filter(User.username == username).first()
+    changed = False
+    if new_hash:
+        # Work factor changed since this hash was made
+        user.password = new_hash
+        changed = True
+
+    # --- NEW: Check Daily Reset on Login ---
+    # FIX: Call the helper function passing the user object
+    if check_daily_reset(user):
+        changed = True
+
+    if changed:
+        db.commit()
+
 @router.post("/auth/google")
 def google_auth(payload: dict, db: Session = Depends(get_db)):
     token = payload.get("token")
@@ -67,8 +107,8 @@ def google_auth(payload: dict, db: Session = Depends(get_db)):
         raise HTTPException(400, "Token missing")
 
     try:
-        # Verify the token with Google
-        idinfo = id_token.verify_oauth2_token(token, requests.Request(), GOOGLE_CLIENT_ID)
+        # Verify the token against Google's (locally cached) signing keys
+        idinfo = google_verifier.verify(token)
     except Exception as e:
         print(f"Google Auth Error: {e}")
         raise HTTPException(401, "Invalid Google token")
@@ -86,7 +126,6 @@ def google_auth(payload: dict, db: Session = Depends(get_db)):
         user = User(
             username=username,
             auth_provider="google",
-            base=DEFAULT_BASE,
             tutorial_progress=1,
             coins=0,
             trophies=1000,
@@ -97,6 +136,8 @@ def google_auth(payload: dict, db: Session = Depends(get_db)):
             last_lives_reset=date.today()
         )
         db.add(user)
+        user.base = DEFAULT_BASE
+        sync_deployed_base(db, user)
         db.commit()
     else:
         # Existing user: Check Daily Reset
@@ -2,16 +2,22 @@ from uuid import uuid4
 from datetime import datetime
 from typing import List, Dict, Any
 
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, undefer
 
-from app.database import get_db
-from app.sql_models import User
+from app.database import get_db, SessionLocal
+from app.sql_models import User, UserBase, BaseHistoryEntry, Draft
 from app.auth import get_current_user  # Updated import location
-from app.models import SubmitPayload, BaseSnapshot, BaseHistoryItem
-from app.simulator import run_lightbot
-from app.routers.levels import _validate_grid, _handle_simulation_errors # Ensure correct relative import if needed
+from app.models import SubmitPayload, BaseSnapshot, BaseHistoryItem, Level
+from app.simulator import LAYOUT_KEYS
+from app.sim_executor import sim_executor, analysis_executor
+from app.solver import solve
+from app.reachability import analyze_reachability
+from app.matchmaking import sync_deployed_base
+from app.snapshots import store_level, load_levels
+from app.config import SOLVER_NODE_BUDGET, SOLVER_TIME_BUDGET
+from app.routers.levels import _validate_grid, _check_reachability, _handle_simulation_errors # Ensure correct relative import if needed
 
 router = APIRouter(prefix="/user/base", tags=["Bases"])
 
@@ -24,12 +30,31 @@ def _is_same_layout(level1: Dict[str, Any], level2: Dict[str, Any]) -> bool:
     Checks if the structural layout of the level is identical.
     Ignores name/description differences.
     """
-    keys = [
-        "gridSize", "heights", "start", "goals",
-        "iceTiles", "teleportLinks", "elevatorMeta"
-    ]
     # Use .get() to safely handle missing keys (e.g. older versions)
-    return all(level1.get(k) == level2.get(k) for k in keys)
+    return all(level1.get(k) == level2.get(k) for k in LAYOUT_KEYS)
+
+
+def _get_user(db: Session, username: str) -> User:
+    user = db.query(User).filter(User.username == username).first()
+    if not user: 
+        raise HTTPException(404, "User not found")
+    return user
+
+
+def _require_user(db: Session, username: str):
+    _get_user(db, username)
+    # Don't hold a pooled connection while the level is validated and simulated
+    db.rollback()
+
+
+def _history_query(db: Session, username: str):
+    """The user's history entries, oldest first, with their snapshots loaded."""
+    return (
+        db.query(BaseHistoryEntry)
+        .options(undefer(BaseHistoryEntry.programs))
+        .filter(BaseHistoryEntry.username == username)
+        .order_by(BaseHistoryEntry.submitted_at)
+    )
 
 
 # =======================
@@ -49,16 +74,24 @@ def get_user_base(
     return user.base or {}
 
 
+@router.post("/reachability")
+def get_reachability(
+    level: Level,
+    current_user: str = Depends(get_current_user)
+):
+    """Reachability map for the editor (cached per layout hash)."""
+    level_data = level.dict()
+    _validate_grid(level_data)
+    return analyze_reachability(level_data)
+
+
 @router.post("/submit")
-def submit_user_base(
+async def submit_user_base(
     payload: SubmitPayload, 
+    background_tasks: BackgroundTasks,
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.username == current_user).first()
-    if not user: 
-        raise HTTPException(404, "User not found")
-
     level_data = payload.level.dict()
     # Use by_alias=False to store canonical keys "m1"/"m2"
     program_data_sim = payload.programs.dict(by_alias=False)
@@ -68,55 +101,103 @@ def submit_user_base(
     level_data.setdefault("teleportLinks", {})
     level_data.setdefault("iceTiles", [])
     
-    # 1. Validate Structure
+    # 1. Unknown users get their 404 before any validation work
+    await run_in_threadpool(_require_user, db, current_user)
+
+    # 2. Validate Structure (and that every goal can be reached at all;
+    #    the graph search is CPU work, so it stays off the event loop)
     _validate_grid(level_data)
+    await run_in_threadpool(_check_reachability, level_data)
     
-    # 2. Validate Solution (Simulation)
-    result = run_lightbot(level_data, program_data_sim)
+    # 3. Validate Solution (Simulation, on the dedicated process pool)
+    result = await sim_executor.simulate(level_data, program_data_sim)
     _handle_simulation_errors(result)
 
-    # 3. Create Snapshot
+    # 4. Persist (blocking DB work stays on the threadpool)
+    response = await run_in_threadpool(
+        _deploy_base, db, current_user, level_data, program_data_sim
+    )
+
+    # 5. Difficulty analysis (optimal solution search) after the response
+    background_tasks.add_task(_analyze_base, current_user, level_data)
+    return response
+
+
+def _deploy_base(db: Session, username: str, level_data: dict, program_data_sim: dict):
+    user = db.query(User).filter(User.username == username).first()
+    if not user: 
+        raise HTTPException(404, "User not found")
+
+    # 4. Create Snapshot
     new_snapshot = {
         "level": level_data,
         "programs": program_data_sim
     }
 
-    # 4. Update Active Base
+    # 5. Update Active Base
     user.base = new_snapshot
+    sync_deployed_base(db, user)
     
-    # 5. Update History
-    if user.base_history is None:
-        user.base_history = []
-        
+    # 6. Update History
     # Check if layout changed significantly before saving to history
     # Filter existing history to avoid duplicates if logic requires, 
     # but standard practice is just to append valid submissions.
     # Here we adopt your original logic: remove duplicates if layout is identical
-    user.base_history = [
-        h for h in user.base_history 
-        if not _is_same_layout(h["level"], level_data)
-    ]
-    
-    history_entry = {
-        "id": str(uuid4()),
-        "level": level_data,
-        "programs": program_data_sim,
-        "submittedAt": datetime.utcnow().isoformat(),
-    }
-    
-    user.base_history.append(history_entry)
-    
-    # Trim to last 20
-    if len(user.base_history) > 20:
-        user.base_history = user.base_history[-20:]
+    entries = _history_query(db, username).all()
+    load_levels(db, [h.level_hash for h in entries])
+
+    history = []
+    for h in entries:
+        if _is_same_layout(h.level, level_data):
+            db.delete(h)
+        else:
+            history.append(h)
+
+    db.add(BaseHistoryEntry(
+        id=str(uuid4()),
+        username=username,
+        # Same content as the active base: only the hash is stored again
+        level_hash=user.active_base.level_hash,
+        programs=program_data_sim,
+        submitted_at=datetime.utcnow(),
+    ))
+
+    # Trim to last 20 (the new entry included)
+    for h in history[:max(0, len(history) + 1 - 20)]:
+        db.delete(h)
 
-    # Crucial for SQLAlchemy JSON updates
-    flag_modified(user, "base_history") 
-    
     db.commit()
     return {"message": "Base validated & deployed"}
 
 
+async def _analyze_base(username: str, level_data: dict):
+    """Runs the solver on the analysis pool and stores its summary as base["analysis"]."""
+    try:
+        # Skipped (503) rather than queued when the analysis pool is busy
+        analysis = await analysis_executor.run(
+            solve, level_data, SOLVER_NODE_BUDGET, SOLVER_TIME_BUDGET
+        )
+    except HTTPException as e:
+        print(f"⚠️ Base analysis skipped for {username}: {e.detail}")
+        return
+
+    await run_in_threadpool(_store_analysis, username, level_data, analysis)
+
+
+def _store_analysis(username: str, level_data: dict, analysis: dict):
+    db = SessionLocal()
+    try:
+        row = db.get(UserBase, username)
+        # The base may have been replaced while the solver was running
+        if not row or not _is_same_layout(row.level or {}, level_data):
+            return
+
+        row.analysis = analysis
+        db.commit()
+    finally:
+        db.close()
+
+
 # =======================
 # HISTORY
 # =======================
@@ -126,13 +207,12 @@ def get_base_history(
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.username == current_user).first()
-    if not user: 
-        raise HTTPException(404, "User not found")
+    _get_user(db, current_user)
 
-    # Return reversed (newest first)
-    history = user.base_history or []
-    return history[::-1]
+    # Newest first
+    history = _history_query(db, current_user).all()
+    load_levels(db, [h.level_hash for h in history])
+    return [h.to_dict() for h in reversed(history)]
 
 
 @router.post("/restore/{history_id}")
@@ -141,28 +221,25 @@ def restore_history_base(
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.username == current_user).first()
-    if not user: 
-        raise HTTPException(404, "User not found")
-
-    history = user.base_history or []
-    entry = next((h for h in history if h["id"] == history_id), None)
+    user = _get_user(db, current_user)
 
+    entry = _history_query(db, current_user).filter(BaseHistoryEntry.id == history_id).first()
     if not entry:
         raise HTTPException(404, "History entry not found")
 
     # Set active base to this entry
     user.base = {
-        "level": entry["level"],
-        "programs": entry["programs"],
+        "level": entry.level,
+        "programs": entry.programs,
     }
+    sync_deployed_base(db, user)
     
     db.commit()
 
     return {
         "message": "Base restored successfully",
-        "level": entry["level"],
-        "programs": entry["programs"],
+        "level": entry.level,
+        "programs": entry.programs,
     }
 
 
@@ -173,27 +250,17 @@ def update_history_name(
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.username == current_user).first()
-    if not user: 
-        raise HTTPException(404, "User not found")
+    _get_user(db, current_user)
 
     new_name = payload.get("name")
     if not new_name:
         raise HTTPException(400, "Name is required")
 
-    history = user.base_history or []
-    found = False
-    
-    for entry in history:
-        if entry["id"] == entry_id:
-            entry["level"]["name"] = new_name
-            found = True
-            break
-            
-    if not found:
+    entry = _history_query(db, current_user).filter(BaseHistoryEntry.id == entry_id).first()
+    if not entry:
         raise HTTPException(404, "History entry not found")
 
-    flag_modified(user, "base_history")
+    entry.level_hash = store_level(db, {**entry.level, "name": new_name})
     db.commit()
     
     return {"message": "Name updated", "newName": new_name}
@@ -208,11 +275,16 @@ def get_base_drafts(
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.username == current_user).first()
-    if not user: 
-        raise HTTPException(404, "User not found")
+    _get_user(db, current_user)
 
-    return user.drafts or []
+    drafts = (
+        db.query(Draft)
+        .options(undefer(Draft.level), undefer(Draft.programs))
+        .filter(Draft.username == current_user)
+        .order_by(Draft.updated_at)
+        .all()
+    )
+    return [d.to_dict() for d in drafts]
 
 @router.post("/draft")
 def save_new_draft(
@@ -220,26 +292,20 @@ def save_new_draft(
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.username == current_user).first()
-    if not user: 
-        raise HTTPException(404, "User not found")
+    _get_user(db, current_user)
     
-    draft = {
-        "id": str(uuid4()),
-        "name": payload.level.name or "Untitled Draft",
-        "level": payload.level.dict(),
-        "programs": payload.programs.dict(by_alias=False),
-        "updatedAt": datetime.utcnow().isoformat(),
-    }
-
-    if user.drafts is None: 
-        user.drafts = []
-        
-    user.drafts.append(draft)
-    flag_modified(user, "drafts")
+    draft = Draft(
+        id=str(uuid4()),
+        username=current_user,
+        name=payload.level.name or "Untitled Draft",
+        level=payload.level.dict(),
+        programs=payload.programs.dict(by_alias=False),
+        updated_at=datetime.utcnow(),
+    )
+    db.add(draft)
     
     db.commit()
-    return {"message": "Draft saved", "draftId": draft["id"]}
+    return {"message": "Draft saved", "draftId": draft.id}
 
 @router.delete("/draft/{draft_id}")
 def delete_draft(
@@ -247,17 +313,16 @@ def delete_draft(
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.username == current_user).first()
-    if not user: 
-        raise HTTPException(404, "User not found")
+    _get_user(db, current_user)
 
-    initial_len = len(user.drafts or [])
-    user.drafts = [d for d in (user.drafts or []) if d["id"] != draft_id]
+    deleted = db.query(Draft).filter(
+        Draft.id == draft_id,
+        Draft.username == current_user
+    ).delete(synchronize_session=False)
     
-    if len(user.drafts) == initial_len:
+    if not deleted:
         raise HTTPException(404, "Draft not found")
 
-    flag_modified(user, "drafts")
     db.commit()
     
     return {"message": "Draft deleted"}
\ No newline at end of file
@@ -2,12 +2,14 @@ from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 from app.database import get_db
 # from app.sql_models import CustomLevel
+from app.sql_models import User
 from app.models import SubmitPayload
 from app.simulator import run_lightbot
+from app.reachability import unreachable_goals
 import math
 from Levels.levels import LEVELS
 from datetime import date
-from app.config import MAX_LIVES  # Ensure MAX_LIVES is in your config.py
+from app.config import MAX_LIVES, MAX_GRID_SIZE  # Ensure MAX_LIVES is in your config.py
 
 router = APIRouter(tags=["Levels"])
 
@@ -20,10 +22,21 @@ def _validate_grid(level: dict):
     if not size or not isinstance(heights, list):
         raise HTTPException(400, "Invalid grid data")
 
+    if size > MAX_GRID_SIZE:
+        raise HTTPException(400, f"gridSize must be at most {MAX_GRID_SIZE}")
+
     if len(heights) != size or any(len(row) != size for row in heights):
         raise HTTPException(400, "Heights do not match gridSize")
 
 
+def _check_reachability(level: dict):
+    """Rejects layouts where some goal can never be reached, before simulating."""
+    goals = unreachable_goals(level)
+    if goals:
+        cells = ", ".join(f"({x}, {y})" for x, y in goals)
+        raise HTTPException(400, f"Unreachable goals: {cells}")
+
+
 def _handle_simulation_errors(result: dict):
     if result.get("success"):
         return
@@ -31,6 +44,7 @@ def _handle_simulation_errors(result: dict):
     reason = result.get("reason")
     errors = {
         "NO_GOALS": "Add at least one goal",
+        "INVALID_START": "Start position is outside the grid",
         "GOALS_NOT_LIT": "Not all goals were lit",
         "TIME_LIMIT_EXCEEDED": "Infinite loop detected",
     }
@@ -82,6 +96,23 @@ def check_daily_reset(user) -> bool:
     return False
 
 
+def current_lives(db: Session, user) -> int:
+    """
+    check_daily_reset for read-only rows (projections, UserContext):
+    applies the reset with a single UPDATE and returns the current lives.
+    """
+    today = date.today()
+    if user.last_lives_reset == today:
+        return user.lives
+
+    db.query(User).filter(User.username == user.username).update(
+        {User.lives: MAX_LIVES, User.last_lives_reset: today},
+        synchronize_session=False
+    )
+    db.commit()
+    return MAX_LIVES
+
+
 def deduct_life(user) -> bool:
     """
     Safely removes a life.
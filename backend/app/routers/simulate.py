@@ -0,0 +1,74 @@
+from fastapi import APIRouter, HTTPException, Depends
+
+from app.auth import get_current_user
+from app.models import BatchSimulationPayload, BaseSnapshot
+from app.config import MAX_BATCH_SIZE
+from app.simulator import simulation_cache, run_lightbot, compile_programs
+from app.sim_executor import sim_executor
+from app.routers.levels import _validate_grid
+
+router = APIRouter(prefix="/simulate", tags=["Simulation"])
+
+
+@router.post("/batch")
+async def simulate_batch(
+    payload: BatchSimulationPayload,
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Runs every {level, programs} snapshot through the simulator.
+    Results come back in request order; invalid grids fail per item
+    instead of failing the whole batch.
+    """
+    if len(payload.items) > MAX_BATCH_SIZE:
+        raise HTTPException(400, f"Batch too large (max {MAX_BATCH_SIZE} items)")
+
+    results = [None] * len(payload.items)
+    snapshots = []
+    indexes = []
+
+    for i, item in enumerate(payload.items):
+        level_data = item.level.dict()
+        try:
+            _validate_grid(level_data)
+        except HTTPException as e:
+            results[i] = {"success": False, "reason": "INVALID_GRID", "detail": e.detail}
+            continue
+
+        snapshots.append({
+            "level": level_data,
+            "programs": item.programs.dict(by_alias=False),
+        })
+        indexes.append(i)
+
+    batch_results = await sim_executor.simulate_batch(snapshots)
+    for i, result in zip(indexes, batch_results):
+        results[i] = result
+
+    return [{"index": i, **result} for i, result in enumerate(results)]
+
+
+@router.post("/trace")
+async def simulate_trace(
+    payload: BaseSnapshot,
+    current_user: str = Depends(get_current_user)
+):
+    """
+    Runs one snapshot and returns its packed step trace
+    (record format documented next to TRACE_STEP in app/simulator.py),
+    so clients can animate a replay without re-implementing the physics.
+    """
+    level_data = payload.level.dict()
+    programs = payload.programs.dict(by_alias=False)
+    _validate_grid(level_data)
+
+    result = await sim_executor.run(run_lightbot, level_data, programs, True)
+    result["gridSize"] = len(level_data["heights"])
+    # Maps TRACE_STEP addresses back to (panel, slot)
+    result["addresses"] = compile_programs(programs).addresses
+    return result
+
+
+@router.get("/cache")
+def simulation_cache_stats(current_user: str = Depends(get_current_user)):
+    return simulation_cache.stats()
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import or_, select, func
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.sql_models import User, BattleLog
 from app.auth import get_current_user  
+from app.user_context import UserContext, get_current_user_context_async
 from app.models import BattleResultPayload
 from app.config import MAX_LIVES
 
@@ -14,37 +16,30 @@ from app.routers.levels import (
     get_level_from_exp, 
     exp_required_for_level,
     check_daily_reset,  # NEW
+    current_lives,
     deduct_life         # NEW
 )
+from app.matchmaking import sync_deployed_base
 
 router = APIRouter(tags=["User Profile"])
 
+
 @router.get("/me")
-def get_me(
-    current_user: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_me(
+    user: UserContext = Depends(get_current_user_context_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Fetch user from SQL
-    user = db.query(User).filter(User.username == current_user).first()
-
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    # User scalars + precomputed base summary, usually straight from the cache
 
     # --- NEW: Check Daily Reset ---
-    # FIX: Call as helper function
-    if check_daily_reset(user):
-        db.commit()
+    lives = await db.run_sync(current_lives, user)
 
-    # BaseSnapshot-aware base info
-    base_snapshot = user.base or {}
     base_info = None
-
-    if base_snapshot and "level" in base_snapshot:
-        level = base_snapshot["level"]
+    if user.base_owner is not None:
         base_info = {
-            "name": level.get("name", "Unknown Base"),
-            "gridSize": level.get("gridSize"),
-            "goals": len(level.get("goals", []))
+            "name": user.base_name,
+            "gridSize": user.base_grid_size,
+            "goals": user.base_goal_count
         }
 
     return {
@@ -56,24 +51,17 @@ def get_me(
         "base_info": base_info,
         
         # --- NEW: Lives Data ---
-        "lives": user.lives,
+        "lives": lives,
         "max_lives": MAX_LIVES
     }
 
 @router.get("/user/profile")
-def get_profile(
-    current_user: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_profile(
+    user: UserContext = Depends(get_current_user_context_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.username == current_user).first()
-
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-        
     # Optional: Check reset here too ensuring profile view is always accurate
-    # FIX: Call as helper function
-    if check_daily_reset(user):
-        db.commit()
+    lives = await db.run_sync(current_lives, user)
 
     total_exp = user.experience
 
@@ -92,12 +80,14 @@ def get_profile(
     # -----------------------------------
 
     # Calculate Total Battles efficiently using SQL Count
-    total_battles = db.query(BattleLog).filter(
-        or_(
-            BattleLog.attacker_id == user.username, 
-            BattleLog.defender_id == user.username
+    total_battles = await db.scalar(
+        select(func.count(BattleLog.id)).where(
+            or_(
+                BattleLog.attacker_id == user.username, 
+                BattleLog.defender_id == user.username
+            )
         )
-    ).count()
+    )
 
     # Rank based on level
     rank = "NOVICE"
@@ -122,7 +112,7 @@ def get_profile(
         "joinedAt": user.joined_at,
         
         # New Stats
-        "lives": user.lives
+        "lives": lives
     }
 
 
@@ -164,6 +154,7 @@ def add_battle_result(
     # Ensure trophies don't go below 0
     new_trophies = user.trophies + payload.trophiesDelta
     user.trophies = max(0, new_trophies)
+    sync_deployed_base(db, user)
 
     db.commit()  # Persist changes to Database
 
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+
+from .config import (
+    SIM_POOL_SIZE, SIM_QUEUE_DEPTH, SIM_JOB_TIMEOUT,
+    ANALYSIS_POOL_SIZE, ANALYSIS_QUEUE_DEPTH, ANALYSIS_NICENESS,
+)
+from .simulator import run_lightbot, run_lightbot_batch, simulation_key, simulation_cache
+
+
+class SimulationExecutor:
+    """
+    Bounded process pool for CPU-bound simulation work.
+
+    Keeps simulations off the FastAPI threadpool (and the GIL) so they can't
+    starve I/O-bound endpoints. At most `workers + queue_depth` jobs are in
+    flight; past that, callers get a 503 instead of queueing forever.
+    """
+
+    def __init__(self, workers: int, queue_depth: int, timeout: float, niceness: int = 0):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        # Workers lower their own CPU priority (POSIX only)
+        self.niceness = niceness if hasattr(os, "nice") else 0
+        self._slots = threading.BoundedSemaphore(self.workers + max(0, queue_depth))
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                if self.niceness:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers, initializer=os.nice, initargs=(self.niceness,)
+                    )
+                else:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _reset_pool(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def run(self, fn, *args):
+        """Runs `fn(*args)` in the pool and awaits the result."""
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(503, "Simulation queue is full, try again later")
+
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset_pool()
+            raise HTTPException(503, "Simulation workers restarting, try again later")
+
+        # The slot is held until the job really finishes, even if we stop
+        # waiting for it, so timed-out jobs still count against the limit
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(504, "Simulation timed out")
+        except BrokenProcessPool:
+            self._reset_pool()
+            raise HTTPException(503, "Simulation workers restarting, try again later")
+
+    async def simulate(self, level, programs):
+        """`run_lightbot` through `simulation_cache`; only misses reach the pool."""
+        key = simulation_key(level, programs)
+        result = simulation_cache.get(key)
+        if result is None:
+            result = await self.run(run_lightbot, level, programs)
+            simulation_cache.put(key, result)
+        return result
+
+    async def simulate_batch(self, snapshots):
+        """`run_lightbot_batch` through `simulation_cache`, as a single pool job."""
+        keys = [simulation_key(s["level"], s["programs"]) for s in snapshots]
+        results = [simulation_cache.get(key) for key in keys]
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            fresh = await self.run(run_lightbot_batch, [snapshots[i] for i in missing])
+            for i, result in zip(missing, fresh):
+                simulation_cache.put(keys[i], result)
+                results[i] = result
+
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+sim_executor = SimulationExecutor(SIM_POOL_SIZE, SIM_QUEUE_DEPTH, SIM_JOB_TIMEOUT)
+
+# Optional background work (base analysis) gets its own small, low-priority
+# pool: when it is full the work is skipped, and gameplay simulations on
+# `sim_executor` never wait behind it
+analysis_executor = SimulationExecutor(
+    ANALYSIS_POOL_SIZE, ANALYSIS_QUEUE_DEPTH, SIM_JOB_TIMEOUT, niceness=ANALYSIS_NICENESS
+)
@@ -1,287 +1,772 @@
-def run_lightbot(level, programs):
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+# Direction order matches frontend revert: 0=North, 1=East, 2=South, 3=West
+# 0(N): dx=0, dy=-1
+# 1(E): dx=1, dy=0
+# 2(S): dx=0, dy=1
+# 3(W): dx=-1, dy=0
+DIRS = [(0, -1), (1, 0), (0, 1), (-1, 0)]
+
+# Incoming momentum of a landing: 0 = standing still, 1 + dir = moved in `dir`
+MOMENTA = [(0, 0)] + DIRS
+
+ELEVATOR_DIRS = {
+    "left": (-1, 0),
+    "right": (1, 0),
+    "up": (0, -1),
+    "down": (0, 1),
+}
+
+
+# Level fields that define the playable layout (name/description/music excluded)
+LAYOUT_KEYS = (
+    "gridSize", "heights", "start", "goals",
+    "iceTiles", "teleportLinks", "elevatorMeta",
+)
+
+
+def layout_key(level):
+    """Canonical string of the layout fields; equal layouts give equal keys."""
+    return json.dumps(
+        {k: level.get(k) for k in LAYOUT_KEYS},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+
+
+def layout_hash(level):
+    """Content hash of the layout (sha256 of `layout_key`)."""
+    return hashlib.sha256(layout_key(level).encode()).hexdigest()
+
+
+class CompiledLevel:
     """
-    Pure logic simulator that mirrors the frontend engine.
-    Supports Teleport > Elevator > Ice priority logic with Momentum.
+    Pre-normalized, flat representation of a level dict.
+    Cells are addressed by index `y * size + x`.
+
+    Build it once with `compile_level()` and pass it to `run_lightbot`
+    as many times as needed: all the string parsing of teleportLinks /
+    elevatorMeta and the goal/ice sets are resolved up front, and the
+    landing table fills in as runs discover new (cell, momentum) pairs.
     """
 
-    heights = level["heights"]
-    start = level["start"]
-    goals = {(g["x"], g["y"]) for g in level["goals"]}
-    
-    # Normalization for fast lookups
-    ice_tiles = {(t["x"], t["y"]) for t in level.get("iceTiles", [])}
+    __slots__ = (
+        "size",
+        "heights",     # flat list of heights
+        "teleport",    # flat list: destination cell index or -1
+        "elevator",    # flat list: (dx, dy) vector or None
+        "ice",         # flat list of bools
+        "neighbors",   # neighbors[dir][cell]: adjacent cell index or -1
+        "goal_bit",    # flat list: bit of the goal on that cell (0 = no goal)
+        "goal_mask",   # all goal bits OR-ed together
+        "start",       # start cell index, or -1 when outside the grid
+        "start_dir",
+        "landing",       # landing[cell * 5 + momentum]: final cell, -1 = not computed yet
+        "landing_loop",  # same index: True when the physics ended in a loop
+    )
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.size and 0 <= y < self.size
+
+
+def _parse_cell_key(key):
+    """Parses an "x,y" key. Returns (x, y) or None."""
+    try:
+        x, y = map(int, key.split(","))
+    except Exception:
+        return None
+    return x, y
 
-    GRID_SIZE = len(heights)
 
-    # --- EARLY REJECT: NO GOALS ---
-    if len(goals) == 0:
-        return {
-            "success": False,
-            "reason": "NO_GOALS",
-        }
+def _elevator_vector(meta):
+    if not meta or not isinstance(meta, dict):
+        return None
+
+    # 1) Named direction
+    d = meta.get("dir")
+    if d:
+        return ELEVATOR_DIRS.get(d) if isinstance(d, str) else None
+
+    # 2) Explicit dx/dy
+    if "dx" in meta and "dy" in meta:
+        dx = meta.get("dx", 0)
+        dy = meta.get("dy", 0)
+        if not isinstance(dx, int) or not isinstance(dy, int):
+            return None
+        if dx == 0 and dy == 0:
+            return None
+        return dx, dy
+
+    # 3) Legacy type
+    t = meta.get("type")
+    if t == "row":
+        return 1, 0
+    if t == "col":
+        return 0, 1
+
+    return None
+
+
+def compile_level(level):
+    """
+    Builds a CompiledLevel from a raw level dict
+    (same shape as `Level` / the frontend level JSON).
+    """
+    if isinstance(level, CompiledLevel):
+        return level
+
+    heights = level["heights"]
+    size = len(heights)
+    cells = size * size
+
+    c = CompiledLevel()
+    c.size = size
+
+    flat_heights = []
+    for y in range(size):
+        row = heights[y]
+        for x in range(size):
+            flat_heights.append(row[x] if x < len(row) else None)
+    c.heights = flat_heights
+
+    c.neighbors = []
+    for dx, dy in DIRS:
+        c.neighbors.append([
+            (y + dy) * size + (x + dx) if c.in_bounds(x + dx, y + dy) else -1
+            for y in range(size)
+            for x in range(size)
+        ])
+
+    # Goals: every distinct goal owns one bit. Goals outside the grid keep
+    # their bit in the mask (they can never be lit, same as before).
+    c.goal_bit = [0] * cells
+    c.goal_mask = 0
+    seen_goals = {}
+    for g in level["goals"]:
+        pos = (g["x"], g["y"])
+        if pos in seen_goals:
+            continue
+        bit = 1 << len(seen_goals)
+        seen_goals[pos] = bit
+        c.goal_mask |= bit
+        if c.in_bounds(*pos):
+            c.goal_bit[pos[1] * size + pos[0]] = bit
+
+    c.ice = [False] * cells
+    for t in level.get("iceTiles") or []:
+        if c.in_bounds(t["x"], t["y"]):
+            c.ice[t["y"] * size + t["x"]] = True
 
     # ----------------------------------
     # TELEPORT DATA NORMALIZATION
     # ----------------------------------
-    raw_links = level.get("teleportLinks") or {}
-    teleport_links = {}
-
-    for k, v in raw_links.items():
-        # Accept either string "x,y" or dict {"to": "x,y"}
+    # Accept either string "x,y" or dict {"to": "x,y"}.
+    # Unparseable or out-of-bounds destinations are ignored.
+    c.teleport = [-1] * cells
+    for k, v in (level.get("teleportLinks") or {}).items():
         dest = v.get("to") if isinstance(v, dict) else v
-        if isinstance(dest, str):
-            teleport_links[k] = dest
+        if not isinstance(dest, str):
+            continue
+        src = _parse_cell_key(k)
+        dst = _parse_cell_key(dest)
+        if src is None or dst is None or f"{src[0]},{src[1]}" != k:
+            continue
+        if c.in_bounds(*src) and c.in_bounds(*dst):
+            c.teleport[src[1] * size + src[0]] = dst[1] * size + dst[0]
 
     # ----------------------------------
     # ELEVATOR META NORMALIZATION
     # ----------------------------------
-    elevator_meta = level.get("elevatorMeta", {}) or {}
+    c.elevator = [None] * cells
+    for k, meta in (level.get("elevatorMeta") or {}).items():
+        src = _parse_cell_key(k)
+        if src is None or f"{src[0]},{src[1]}" != k or not c.in_bounds(*src):
+            continue
+        c.elevator[src[1] * size + src[0]] = _elevator_vector(meta)
 
-    # Normalize programs keys
-    programs = {str(k).lower(): v for k, v in (programs or {}).items()}
+    start = level["start"]
+    sx, sy = start["x"], start["y"]
+    c.start = sy * size + sx if c.in_bounds(sx, sy) else -1
+    c.start_dir = start["dir"] % 4
 
-    robot = {"x": start["x"], "y": start["y"], "dir": start["dir"]}
-    lit = set()
-
-    # Direction order matches frontend revert: 0=North, 1=East, 2=South, 3=West
-    # 0(N): dx=0, dy=-1
-    # 1(E): dx=1, dy=0
-    # 2(S): dx=0, dy=1
-    # 3(W): dx=-1, dy=0
-    dirs = [(0, -1), (1, 0), (0, 1), (-1, 0)]
-
-    def in_bounds(x, y):
-        return 0 <= x < GRID_SIZE and 0 <= y < GRID_SIZE
-
-    def get_h(x, y):
-        return heights[y][x] if in_bounds(x, y) else None
-
-    # -------------------------------
-    # ELEVATOR VECTOR HELPER
-    # -------------------------------
-    def get_elevator_vector(x, y):
-        key = f"{x},{y}"
-        meta = elevator_meta.get(key)
-        if not meta:
-            return None
+    c.landing = [-1] * (cells * len(MOMENTA))
+    c.landing_loop = [False] * (cells * len(MOMENTA))
 
-        # 1) Named direction
-        d = meta.get("dir")
-        if d:
-            return {
-                "left": (-1, 0),
-                "right": (1, 0),
-                "up": (0, -1),
-                "down": (0, 1),
-            }.get(d)
-
-        # 2) Explicit dx/dy
-        if "dx" in meta and "dy" in meta:
-            dx = meta.get("dx", 0)
-            dy = meta.get("dy", 0)
-            if dx == 0 and dy == 0:
-                return None
-            return dx, dy
-
-        # 3) Legacy type
-        t = meta.get("type")
-        if t == "row":
-            return 1, 0
-        if t == "col":
-            return 0, 1
+    return c
 
-        return None
 
-    # -------------------------------
-    # LANDING LOGIC (Teleport > Elevator > Ice)
-    # -------------------------------
-    def resolve_landing(in_dx, in_dy):
-        """
-        The 'Landing Barrier'.
-        Continually applies physics effects until stable.
-        Uses Momentum (mom_dx, mom_dy) for ice/elevator logic.
-        """
-        safety = GRID_SIZE * GRID_SIZE * 4  # Safety cutout
-        visited_states = set()  # To detect infinite loops
-        
-        # Initialize Momentum
-        mom_dx = in_dx
-        mom_dy = in_dy
-
-        while safety > 0:
-            safety -= 1
-            x, y = robot["x"], robot["y"]
-            key = f"{x},{y}"
-            
-            # Loop detection includes MOMENTUM to allow crossing paths
-            state_key = f"{x},{y},{robot['dir']},{mom_dx},{mom_dy}"
-            
-            # Only trigger loop check if we are on active tiles
-            is_ice = (x, y) in ice_tiles
-            has_elevator = get_elevator_vector(x, y) is not None
-            
-            if (is_ice or has_elevator) and state_key in visited_states:
-                # Infinite loop detected in physics
-                break
-            visited_states.add(state_key)
-
-            moved = False
-
-            # --- 1. PRIORITY: TELEPORT ---
-            dest_key = teleport_links.get(key)
-            if dest_key:
-                try:
-                    tx, ty = map(int, dest_key.split(","))
-                    if in_bounds(tx, ty):
-                        robot["x"], robot["y"] = tx, ty
-                        moved = True
-                        
-                        # Teleport kills momentum
-                        mom_dx = 0
-                        mom_dy = 0
-                        
-                        visited_states.clear() # Reset history
-                except Exception:
-                    pass
-
-            # --- 2. PRIORITY: ELEVATOR ---
-            if not moved:
-                vec = get_elevator_vector(x, y)
-                if vec:
-                    dx, dy = vec
-                    nx, ny = x + dx, y + dy
-                    
-                    if in_bounds(nx, ny):
-                        cur_h = get_h(x, y)
-                        next_h = get_h(nx, ny)
-                        if next_h is not None and next_h <= cur_h:
-                            robot["x"], robot["y"] = nx, ny
-                            moved = True
-                            
-                            # Elevator UPDATES momentum
-                            mom_dx = dx
-                            mom_dy = dy
-
-            # --- 3. PRIORITY: ICE ---
-            # Slide based on MOMENTUM, not robot facing direction
-            if not moved and (x, y) in ice_tiles:
-                if mom_dx != 0 or mom_dy != 0:
-                    nx, ny = x + mom_dx, y + mom_dy
-
-                    if in_bounds(nx, ny):
-                        cur_h = get_h(x, y)
-                        next_h = get_h(nx, ny)
-                        
-                        # Slide allowed on equal or lower height
-                        if next_h is not None and next_h <= cur_h:
-                            robot["x"], robot["y"] = nx, ny
-                            moved = True
-                        else:
-                            # Hit wall -> stop momentum
-                            mom_dx = 0
-                            mom_dy = 0
-                    else:
-                        # Hit edge -> stop momentum
-                        mom_dx = 0
-                        mom_dy = 0
-
-            if not moved:
-                break
-        
-        return
-
-    # -------------------------------
-    # MOVEMENT & ACTIONS
-    # -------------------------------
-    def move(jump=False):
-        dx, dy = dirs[robot["dir"]]
-        nx = robot["x"] + dx
-        ny = robot["y"] + dy
-
-        if not in_bounds(nx, ny):
-            return False
-
-        h0 = get_h(robot["x"], robot["y"])
-        h1 = get_h(nx, ny)
-        if h1 is None:
-            return False
-
-        if not jump:
-            # forward: flat only
-            if h1 != h0:
-                return False
-        else:
-            # jump logic
-            if h1 == h0:
-                return False
-            if h1 > h0 + 1:
-                return False
-
-        robot["x"], robot["y"] = nx, ny
-        
-        # Trigger physics passing the MOVEMENT VECTOR as initial momentum
-        resolve_landing(dx, dy)
-        return True
-
-    def light():
-        pos = (robot["x"], robot["y"])
-        if pos in goals:
-            if pos in lit:
-                lit.remove(pos)
+@lru_cache(maxsize=256)
+def _compile_layout(key):
+    return compile_level(json.loads(key))
+
+
+def compile_level_cached(level):
+    """
+    `compile_level` memoized per layout (per process), so the lazily
+    filled landing table is shared by every run on the same layout.
+    """
+    if isinstance(level, CompiledLevel):
+        return level
+    return _compile_layout(layout_key(level))
+
+
+# -------------------------------
+# TRACE RECORDS
+# -------------------------------
+# A trace is a flat list of ints, each `value << 3 | kind`:
+#   TRACE_STEP      value = address of the instruction about to run
+#   TRACE_POSE      value = cell * 4 + facing, after a walk/jump/turn
+#   TRACE_TELEPORT  value = cell, physics hop
+#   TRACE_ELEVATOR  value = cell, physics hop
+#   TRACE_ICE       value = cell, physics hop
+#   TRACE_LIGHT     value = cell * 2 + (1 if now lit else 0)
+# Records before the first TRACE_STEP are the initial pose and landing.
+TRACE_STEP = 0
+TRACE_POSE = 1
+TRACE_TELEPORT = 2
+TRACE_ELEVATOR = 3
+TRACE_ICE = 4
+TRACE_LIGHT = 5
+
+TRACE_KINDS = ("step", "pose", "teleport", "elevator", "ice", "light")
+
+
+# -------------------------------
+# LANDING LOGIC (Teleport > Elevator > Ice)
+# -------------------------------
+def resolve_landing(lvl, pos, in_dx, in_dy, events=None):
+    """
+    The 'Landing Barrier'.
+    Continually applies physics effects to the robot standing on `pos`
+    until stable and returns the final cell index.
+    Uses Momentum (mom_dx, mom_dy) for ice/elevator logic.
+
+    When `events` is a list, every hop is appended to it as a packed
+    trace record (see TRACE_* below).
+    """
+    return _settle(lvl, pos, in_dx, in_dy, events)[0]
+
+
+def _settle(lvl, pos, in_dx, in_dy, events=None):
+    """`resolve_landing` body; returns (final cell, ended in a loop)."""
+    size = lvl.size
+    heights = lvl.heights
+    teleport = lvl.teleport
+    elevator = lvl.elevator
+    ice = lvl.ice
+
+    safety = size * size * 4  # Safety cutout
+    visited_states = set()  # To detect infinite loops
+
+    # Initialize Momentum
+    mom_dx = in_dx
+    mom_dy = in_dy
+
+    while safety > 0:
+        safety -= 1
+        vec = elevator[pos]
+
+        # Loop detection includes MOMENTUM to allow crossing paths.
+        # Only trigger loop check if we are on active tiles
+        state_key = (pos, mom_dx, mom_dy)
+        if (ice[pos] or vec is not None) and state_key in visited_states:
+            # Infinite loop detected in physics
+            return pos, True
+        visited_states.add(state_key)
+
+        # --- 1. PRIORITY: TELEPORT ---
+        dest = teleport[pos]
+        if dest >= 0:
+            pos = dest
+            if events is not None:
+                events.append(pos << 3 | TRACE_TELEPORT)
+            # Teleport kills momentum
+            mom_dx = 0
+            mom_dy = 0
+            visited_states.clear()  # Reset history
+            continue
+
+        x, y = pos % size, pos // size
+
+        # --- 2. PRIORITY: ELEVATOR ---
+        if vec is not None:
+            dx, dy = vec
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < size and 0 <= ny < size:
+                nxt = ny * size + nx
+                next_h = heights[nxt]
+                if next_h is not None and next_h <= heights[pos]:
+                    pos = nxt
+                    if events is not None:
+                        events.append(pos << 3 | TRACE_ELEVATOR)
+                    # Elevator UPDATES momentum
+                    mom_dx = dx
+                    mom_dy = dy
+                    continue
+
+        # --- 3. PRIORITY: ICE ---
+        # Slide based on MOMENTUM, not robot facing direction
+        if ice[pos] and (mom_dx != 0 or mom_dy != 0):
+            nx, ny = x + mom_dx, y + mom_dy
+            if 0 <= nx < size and 0 <= ny < size:
+                nxt = ny * size + nx
+                next_h = heights[nxt]
+                # Slide allowed on equal or lower height
+                if next_h is not None and next_h <= heights[pos]:
+                    pos = nxt
+                    if events is not None:
+                        events.append(pos << 3 | TRACE_ICE)
+                    continue
+            # Hit wall / edge -> stop momentum
+            mom_dx = 0
+            mom_dy = 0
+
+        return pos, False
+
+    # Safety cutout reached (e.g. two teleports pointing at each other)
+    return pos, True
+
+
+def land(lvl, cell, momentum):
+    """
+    Landing table lookup: final cell for arriving on `cell` with
+    MOMENTA[momentum]. Each entry is resolved once per CompiledLevel.
+    """
+    k = cell * 5 + momentum
+    dest = lvl.landing[k]
+    if dest < 0:
+        dx, dy = MOMENTA[momentum]
+        dest, looped = _settle(lvl, cell, dx, dy)
+        lvl.landing[k] = dest
+        lvl.landing_loop[k] = looped
+    return dest
+
+
+def build_landing_table(lvl):
+    """Fills the whole landing table up front and returns it."""
+    for cell in range(lvl.size * lvl.size):
+        for momentum in range(len(MOMENTA)):
+            land(lvl, cell, momentum)
+    return lvl.landing
+
+
+# -------------------------------
+# PROGRAM BYTECODE
+# -------------------------------
+# Panels are compiled into one flat list of ints: main first, then m1, m2,
+# each terminated by OP_RET. A call is encoded as OP_CALL + target address.
+# Every opcode costs exactly one step, like one command slot did before
+# (empty slots, unknown commands and calls to empty panels are OP_NOP).
+OP_NOP = 0
+OP_F = 1
+OP_J = 2
+OP_TL = 3
+OP_TR = 4
+OP_L = 5
+OP_RET = 6
+OP_CALL = 8
+
+OPCODES = {"F": OP_F, "J": OP_J, "TL": OP_TL, "TR": OP_TR, "L": OP_L}
+PANELS = ("main", "m1", "m2")
+CALLS = {"M1": "m1", "M2": "m2"}
+
+MAX_STEPS = 5000
+
+
+class CompiledProgram:
+    """Bytecode for a `programs` dict ({main, m1, m2}), see `compile_programs()`."""
+
+    __slots__ = ("code", "entry", "addresses")
+
+
+# Frontend panel names, same as the Programs model aliases
+PANEL_ALIASES = {"p1": "m1", "p2": "m2"}
+
+
+def normalize_programs(programs):
+    """{main, m1, m2} command lists; keys are case-insensitive, p1/p2 stand for m1/m2."""
+    programs = {str(k).lower(): v for k, v in (programs or {}).items()}
+    for alias, name in PANEL_ALIASES.items():
+        if name not in programs and alias in programs:
+            programs[name] = programs[alias]
+    return {name: list(programs.get(name) or []) for name in PANELS}
+
+
+def compile_programs(programs):
+    if isinstance(programs, CompiledProgram):
+        return programs
+
+    panels = normalize_programs(programs)
+
+    # Resolve panel addresses first so calls can point straight at them
+    entry = {}
+    addr = 0
+    for name in PANELS:
+        entry[name] = addr
+        addr += len(panels[name]) + 1
+
+    code = []
+    for name in PANELS:
+        for cmd in panels[name]:
+            if not cmd or not isinstance(cmd, str):
+                code.append(OP_NOP)
+            elif cmd in CALLS:
+                target = CALLS[cmd]
+                code.append(OP_CALL + entry[target] if any(panels[target]) else OP_NOP)
             else:
-                lit.add(pos)
+                code.append(OPCODES.get(cmd, OP_NOP))
+        code.append(OP_RET)
 
-    # -------------------------------
-    # EXECUTION ENGINE
-    # -------------------------------
-    stack = [{"panel": "main", "ip": 0}]
-    steps = 0
-    MAX_STEPS = 5000
+    p = CompiledProgram()
+    p.code = code
+    p.entry = entry["main"]
+    p.addresses = entry  # panel name -> address of its first slot
+    return p
+
+
+def run_lightbot(level, programs, trace=False):
+    """
+    Pure logic simulator that mirrors the frontend engine.
+    Supports Teleport > Elevator > Ice priority logic with Momentum.
+
+    `level` may be a raw level dict or a CompiledLevel from `compile_level()`,
+    `programs` a raw programs dict or a CompiledProgram from `compile_programs()`.
+    With `trace=True` the result also carries the packed step trace
+    (see TRACE_STEP).
+    """
+    lvl = compile_level_cached(level)
+
+    # --- EARLY REJECT: NO GOALS / START OUTSIDE THE GRID ---
+    reject = None
+    if lvl.goal_mask == 0:
+        reject = "NO_GOALS"
+    elif lvl.start < 0:
+        reject = "INVALID_START"
+    if reject:
+        result = {"success": False, "reason": reject}
+        if trace:
+            result["trace"] = []
+        return result
+
+    prog = compile_programs(programs)
 
     # Initial Physics Check (Standing still = 0 momentum)
-    resolve_landing(0, 0)
+    if trace:
+        records = [(lvl.start * 4 + lvl.start_dir) << 3 | TRACE_POSE]
+        pos = resolve_landing(lvl, lvl.start, 0, 0, records)
+    else:
+        records = None
+        pos = land(lvl, lvl.start, 0)
+
+    status, _, _, _, steps, loop_start = execute(
+        lvl, prog.code, prog.entry, pos, lvl.start_dir, 0, MAX_STEPS, records
+    )
+    result = _run_result(status, steps, loop_start)
+    if trace:
+        result["trace"] = records
+    return result
+
+
+def _run_result(status, steps, loop_start):
+    if status == EXEC_SUCCESS:
+        return {"success": True, "reason": "SUCCESS"}
+    if status == EXEC_LOOP:
+        return {
+            "success": False,
+            "reason": "TIME_LIMIT_EXCEEDED",
+            "loop_start": loop_start,
+        }
+    if steps >= MAX_STEPS:
+        return {"success": False, "reason": "TIME_LIMIT_EXCEEDED"}
+    return {"success": False, "reason": "GOALS_NOT_LIT"}
+
+
+# -------------------------------
+# EXECUTION ENGINE
+# -------------------------------
+EXEC_RETURNED = 0      # the starting frame returned
+EXEC_SUCCESS = 1       # every goal is lit
+EXEC_LOOP = 2          # provably never returns nor succeeds
+EXEC_OUT_OF_STEPS = 3  # step budget used up
+
+
+def execute(lvl, code, ip, pos, facing, lit, max_steps, trace=None):
+    """
+    Runs bytecode from `ip` until the frame entered there returns,
+    all goals are lit, a cycle is proven or `max_steps` run out.
+    Returns (status, pos, facing, lit, steps, loop_start).
+
+    `run_lightbot` enters at main; the solver also enters at m1/m2
+    to evaluate a function call as a single macro move. When `trace`
+    is a list, packed trace records (see TRACE_STEP) are appended to it.
+    """
+    heights = lvl.heights
+    neighbors = lvl.neighbors
+    landing = lvl.landing
+    goal_bit = lvl.goal_bit
+    goal_mask = lvl.goal_mask
+
+    returns = []  # return addresses; the entry frame is implicit
+    steps = 0
+
+    # Cycle detection: machine state (ip, pos, facing, lit) at every call,
+    # mapped to the step it was seen at. An entry stays valid only while the
+    # stack hasn't dropped below the height it was recorded at, so seeing it
+    # again means the run repeats forever and can never light the goals.
+    seen_calls = {}
+    seen_at_height = [[]]
 
-    while stack and steps < MAX_STEPS:
+    while steps < max_steps:
         steps += 1
+        if trace is not None:
+            trace.append(ip << 3 | TRACE_STEP)
+        op = code[ip]
+        ip += 1
+
+        if op == OP_F or op == OP_J:
+            nxt = neighbors[facing][pos]
+            if nxt < 0:
+                continue
+            h0 = heights[pos]
+            h1 = heights[nxt]
+            if h1 is None:
+                continue
+            if op == OP_F:
+                # forward: flat only
+                if h1 != h0:
+                    continue
+            elif h1 == h0 or h1 > h0 + 1:
+                # jump: exactly one step up, or any step down
+                continue
+            # Physics with the MOVEMENT VECTOR as initial momentum,
+            # straight from the landing table once it's been resolved
+            if trace is not None:
+                # Traced runs resolve the hops again to record them
+                trace.append((nxt * 4 + facing) << 3 | TRACE_POSE)
+                dx, dy = DIRS[facing]
+                pos = resolve_landing(lvl, nxt, dx, dy, trace)
+                continue
+            pos = landing[nxt * 5 + 1 + facing]
+            if pos < 0:
+                pos = land(lvl, nxt, 1 + facing)
+        elif op == OP_TL or op == OP_TR:
+            facing = (facing + (3 if op == OP_TL else 1)) % 4
+            if trace is not None:
+                trace.append((pos * 4 + facing) << 3 | TRACE_POSE)
+        elif op == OP_L:
+            bit = goal_bit[pos]
+            lit ^= bit
+            if trace is not None and bit:
+                trace.append((pos * 2 + (1 if lit & bit else 0)) << 3 | TRACE_LIGHT)
+            if lit == goal_mask:
+                return EXEC_SUCCESS, pos, facing, lit, steps, None
+        elif op == OP_RET:
+            if not returns:
+                return EXEC_RETURNED, pos, facing, lit, steps, None
+            ip = returns.pop()
+            for key in seen_at_height.pop():
+                del seen_calls[key]
+        elif op >= OP_CALL:
+            key = (ip, pos, facing, lit)
+            loop_start = seen_calls.get(key)
+            if loop_start is not None:
+                return EXEC_LOOP, pos, facing, lit, steps, loop_start
+            seen_calls[key] = steps
+            seen_at_height[-1].append(key)
+            seen_at_height.append([])
+
+            returns.append(ip)
+            ip = op - OP_CALL
+
+    return EXEC_OUT_OF_STEPS, pos, facing, lit, steps, None
+
+
+def decode_trace(records, size):
+    """Expands packed trace records into readable dicts (debugging / clients)."""
+    out = []
+    for record in records:
+        kind, value = record & 7, record >> 3
+        if kind == TRACE_STEP:
+            out.append({"type": "step", "ip": value})
+        elif kind == TRACE_POSE:
+            cell, facing = divmod(value, 4)
+            out.append({"type": "pose", "x": cell % size, "y": cell // size, "dir": facing})
+        elif kind == TRACE_LIGHT:
+            cell, on = divmod(value, 2)
+            out.append({"type": "light", "x": cell % size, "y": cell // size, "on": bool(on)})
+        else:
+            out.append({"type": TRACE_KINDS[kind], "x": value % size, "y": value // size})
+    return out
 
-        frame = stack[-1]
-        cmds = programs.get(frame["panel"], [])
 
-        if frame["ip"] >= len(cmds):
-            stack.pop()
-            continue
+# -------------------------------
+# BATCH SIMULATION
+# -------------------------------
+def _run_chunk(level, programs_list):
+    lvl = compile_level_cached(level)
+    return [run_lightbot(lvl, programs) for programs in programs_list]
 
-        cmd = cmds[frame["ip"]]
-        frame["ip"] += 1
 
-        if not cmd:
-            continue
+def run_lightbot_batch(snapshots, workers=None):
+    """
+    Simulates many {"level": ..., "programs": ...} snapshots.
+    Entries with the same layout share one CompiledLevel.
+    Returns the results in input order.
+
+    With `workers` > 1 the work is fanned out over a process pool,
+    in chunks that each compile their level once.
+    """
+    groups = {}
+    for i, snap in enumerate(snapshots):
+        level = snap["level"]
+        group = groups.setdefault(layout_key(level), (level, []))
+        group[1].append((i, snap["programs"]))
+
+    results = [None] * len(snapshots)
+
+    if not workers or workers <= 1 or len(snapshots) <= 1:
+        for key, (level, entries) in groups.items():
+            lvl = _compile_layout(key)
+            for i, programs in entries:
+                results[i] = run_lightbot(lvl, programs)
+        return results
+
+    # Split big groups so a single popular layout still uses every worker
+    chunk_size = max(1, -(-len(snapshots) // workers))
+    chunks = []
+    for level, entries in groups.values():
+        for start in range(0, len(entries), chunk_size):
+            chunks.append((level, entries[start:start + chunk_size]))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_run_chunk, level, [programs for _, programs in entries])
+            for level, entries in chunks
+        ]
+        for (level, entries), future in zip(chunks, futures):
+            for (i, _), result in zip(entries, future.result()):
+                results[i] = result
+
+    return results
 
-        if cmd == "F":
-            move(False)
-        elif cmd == "J":
-            move(True)
-        elif cmd == "TL":
-            robot["dir"] = (robot["dir"] + 3) % 4
-        elif cmd == "TR":
-            robot["dir"] = (robot["dir"] + 1) % 4
-        elif cmd == "L":
-            light()
-            if goals.issubset(lit):
-                return {"success": True, "reason": "SUCCESS"}
-        elif cmd in ("M1", "M2"):
-            panel_name = cmd.lower()
-            sub = programs.get(panel_name, [])
-            if any(sub):
-                stack.append({"panel": panel_name, "ip": 0})
-        
-        # Check success after every command
-        if goals.issubset(lit):
-            return {"success": True, "reason": "SUCCESS"}
-
-    if not goals.issubset(lit):
-        if steps >= MAX_STEPS:
-            return {"success": False, "reason": "TIME_LIMIT_EXCEEDED"}
-        return {"success": False, "reason": "GOALS_NOT_LIT"}
-
-    return {"success": True, "reason": "SUCCESS"}
\ No newline at end of file
+
+# -------------------------------
+# RESULT CACHE
+# -------------------------------
+# Bump whenever physics or step accounting change, so cached results
+# (including the on-disk store) from older engines are never reused.
+ENGINE_VERSION = 2
+
+
+def programs_key(programs):
+    """Canonical string of the panels exactly as `compile_programs` reads them."""
+    return json.dumps(normalize_programs(programs), separators=(",", ":"))
+
+
+def simulation_key(level, programs):
+    """Content hash of layout + programs; equal inputs always simulate equally."""
+    raw = f"{ENGINE_VERSION}|{layout_key(level)}|{programs_key(programs)}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class SimulationCache:
+    """
+    Bounded LRU of simulation results keyed by `simulation_key()`.
+    With `path` set, results are also kept in a small SQLite file
+    so they survive restarts and are shared between processes.
+    """
+
+    def __init__(self, max_size=4096, path=None):
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+
+        if path:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS sim_results (key TEXT PRIMARY KEY, result TEXT)"
+            )
+            self._disk.commit()
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(result)
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT result FROM sim_results WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+                    self.hits += 1
+                    return dict(result)
+
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        with self._lock:
+            self._remember(key, dict(result))
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO sim_results (key, result) VALUES (?, ?)",
+                    (key, json.dumps(result)),
+                )
+                self._disk.commit()
+
+    def _remember(self, key, result):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM sim_results")
+                self._disk.commit()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk": self.path,
+            }
+
+
+simulation_cache = SimulationCache(
+    max_size=int(os.getenv("SIM_CACHE_SIZE", "4096")),
+    path=os.getenv("SIM_CACHE_PATH") or None,
+)
+
+
+def run_lightbot_cached(level, programs):
+    """`run_lightbot` for raw dicts, served from `simulation_cache` when possible."""
+    key = simulation_key(level, programs)
+    result = simulation_cache.get(key)
+    if result is None:
+        result = run_lightbot(level, programs)
+        simulation_cache.put(key, result)
+    return result
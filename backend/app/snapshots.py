@@ -0,0 +1,106 @@
+"""
+Content-addressed level snapshots.
+
+Every stored copy of a level (active base, base history, frozen attack
+sessions, battle logs) is interned once in `level_snapshots` under
+`snapshot_hash(level)` and referenced by that hash. Snapshots are
+immutable, so loaded levels are also kept in a bounded in-process LRU;
+callers must treat returned dicts as read-only.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.sql_models import LevelSnapshot
+
+SNAPSHOT_CACHE_SIZE = 2048
+
+
+def snapshot_hash(level: dict) -> str:
+    """sha256 of the canonical JSON of the whole level (layout + name/music)."""
+    raw = json.dumps(level, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class _LevelCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            level = self._entries.get(key)
+            if level is not None:
+                self._entries.move_to_end(key)
+            return level
+
+    def put(self, key, level):
+        with self._lock:
+            self._entries[key] = level
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+level_cache = _LevelCache(SNAPSHOT_CACHE_SIZE)
+
+
+def store_level(db: Session, level: dict) -> str:
+    """Interns `level` (no-op if already stored) and returns its hash."""
+    key = snapshot_hash(level)
+    # Always asks the database (a PK lookup): the cache may hold levels
+    # whose inserting transaction was rolled back
+    if db.get(LevelSnapshot, key) is not None:
+        return key
+
+    try:
+        with db.begin_nested():
+            db.add(LevelSnapshot(hash=key, level=level))
+    except IntegrityError:
+        # Stored concurrently by another request: same content, nothing to do
+        pass
+    return key
+
+
+def load_level(db: Session, key: str):
+    """The level stored under `key` (None for a missing/None key)."""
+    if not key:
+        return None
+    level = level_cache.get(key)
+    if level is None:
+        row = db.get(LevelSnapshot, key)
+        if row is None:
+            return None
+        level = row.level
+        level_cache.put(key, level)
+    return level
+
+
+def load_levels(db: Session, keys) -> dict:
+    """Bulk `load_level`: {hash: level} with one query for all cache misses."""
+    found = {}
+    missing = set()
+    for key in keys:
+        if not key:
+            continue
+        level = level_cache.get(key)
+        if level is None:
+            missing.add(key)
+        else:
+            found[key] = level
+
+    if missing:
+        rows = db.query(LevelSnapshot).filter(LevelSnapshot.hash.in_(missing)).all()
+        for row in rows:
+            level_cache.put(row.hash, row.level)
+            found[row.hash] = row.level
+    return found
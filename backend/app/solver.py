@@ -0,0 +1,301 @@
+"""
+Optimal-solution search built on the simulator.
+
+Finds the program with the fewest filled slots (main + m1 + m2, within
+PROGRAM_SIZES) that solves a level:
+
+1. BFS over robot states with primitive commands gives the shortest action
+   count and proves unsolvable layouts (functions can't reach states that
+   primitives can't).
+2. Function bodies are enumerated by increasing size; for each (m1, m2)
+   pair a BFS over main treats M1/M2 as macro moves (evaluated with the real
+   engine, memoized per state). Bodies stop once they can't beat the best
+   solution found so far.
+
+States are packed into one int ((lit * cells + pos) * 4 + facing) and kept
+in a transposition table per search. Node and time budgets bound the work;
+when they run out the best solution so far is returned with optimal=False.
+Every returned solution is re-checked with `run_lightbot`.
+"""
+import time
+from itertools import product
+
+from .simulator import (
+    OP_F, OP_J, OP_TL, OP_TR, OP_L,
+    EXEC_RETURNED, EXEC_SUCCESS,
+    MAX_STEPS, compile_level_cached, compile_programs, execute, land, run_lightbot,
+)
+
+PROGRAM_SIZES = {"main": 12, "m1": 8, "m2": 8}
+PRIMITIVES = ("F", "J", "TL", "TR", "L")
+PRIMITIVE_OPS = {"F": OP_F, "J": OP_J, "TL": OP_TL, "TR": OP_TR, "L": OP_L}
+
+DEFAULT_NODE_BUDGET = 200_000
+DEFAULT_TIME_BUDGET = 2.0  # seconds
+
+
+class _OutOfBudget(Exception):
+    pass
+
+
+class _Budget:
+    def __init__(self, nodes, seconds):
+        self.nodes_left = nodes
+        self.deadline = time.monotonic() + seconds
+        self.nodes = 0
+
+    def spend(self, n=1):
+        self.nodes += n
+        self.nodes_left -= n
+        if self.nodes_left < 0:
+            raise _OutOfBudget()
+        if self.nodes % 256 == 0 and time.monotonic() > self.deadline:
+            raise _OutOfBudget()
+
+
+class _Search:
+    """Per-level helpers shared by every BFS of one `solve()` call."""
+
+    def __init__(self, lvl, budget):
+        self.lvl = lvl
+        self.cells = lvl.size * lvl.size
+        self.budget = budget
+
+    def pack(self, pos, facing, lit):
+        return ((lit * self.cells) + pos) * 4 + facing
+
+    def unpack(self, state):
+        rest, facing = divmod(state, 4)
+        lit, pos = divmod(rest, self.cells)
+        return pos, facing, lit
+
+    def primitive(self, op, pos, facing, lit):
+        """One primitive command; returns (pos, facing, lit)."""
+        lvl = self.lvl
+        if op == OP_F or op == OP_J:
+            nxt = lvl.neighbors[facing][pos]
+            if nxt < 0:
+                return pos, facing, lit
+            h0 = lvl.heights[pos]
+            h1 = lvl.heights[nxt]
+            if h1 is None:
+                return pos, facing, lit
+            if op == OP_F:
+                if h1 != h0:
+                    return pos, facing, lit
+            elif h1 == h0 or h1 > h0 + 1:
+                return pos, facing, lit
+            return land(lvl, nxt, 1 + facing), facing, lit
+        if op == OP_TL:
+            return pos, (facing + 3) % 4, lit
+        if op == OP_TR:
+            return pos, (facing + 1) % 4, lit
+        return pos, facing, lit ^ lvl.goal_bit[pos]
+
+    def bfs(self, start, actions, limit):
+        """
+        Shortest action sequence (at most `limit` long) that lights every goal.
+        `actions` maps a name to step(pos, facing, lit) -> (won, pos, facing, lit),
+        with pos None for a dead end. Returns the list of names or None.
+        """
+        parents = {start: None}
+        frontier = [start]
+        depth = 0
+
+        while frontier and depth < limit:
+            depth += 1
+            next_frontier = []
+            for state in frontier:
+                self.budget.spend()
+                pos, facing, lit = self.unpack(state)
+                for name, step in actions:
+                    won, npos, nfacing, nlit = step(pos, facing, lit)
+                    if won:
+                        return self._path(parents, state) + [name]
+                    if npos is None:
+                        continue
+                    nstate = self.pack(npos, nfacing, nlit)
+                    if nstate not in parents:
+                        parents[nstate] = (state, name)
+                        next_frontier.append(nstate)
+            frontier = next_frontier
+
+        return None
+
+    @staticmethod
+    def _path(parents, state):
+        path = []
+        while parents[state] is not None:
+            state, name = parents[state]
+            path.append(name)
+        return path[::-1]
+
+    def primitive_actions(self, light_once=False):
+        """
+        Primitive commands as BFS actions. With `light_once`, L is only
+        offered on an unlit goal: without function calls, switching a goal
+        off is never part of a shortest solution.
+        """
+        goal_mask = self.lvl.goal_mask
+        goal_bit = self.lvl.goal_bit
+        actions = []
+        for name in PRIMITIVES:
+            def step(pos, facing, lit, op=PRIMITIVE_OPS[name]):
+                if light_once and op == OP_L:
+                    bit = goal_bit[pos]
+                    if not bit or lit & bit:
+                        return False, None, None, None
+                pos, facing, lit = self.primitive(op, pos, facing, lit)
+                return op == OP_L and lit == goal_mask, pos, facing, lit
+            actions.append((name, step))
+        return actions
+
+    def macro_action(self, code, entry):
+        """A call to the function at `entry`, memoized per state."""
+        memo = {}
+
+        def step(pos, facing, lit):
+            key = self.pack(pos, facing, lit)
+            hit = memo.get(key)
+            if hit is None:
+                self.budget.spend()
+                status, npos, nfacing, nlit, _, _ = execute(
+                    self.lvl, code, entry, pos, facing, lit, MAX_STEPS
+                )
+                if status == EXEC_SUCCESS:
+                    hit = (True, npos, nfacing, nlit)
+                elif status == EXEC_RETURNED:
+                    hit = (False, npos, nfacing, nlit)
+                else:
+                    # Never returns: nothing after this call would run
+                    hit = (False, None, None, None)
+                memo[key] = hit
+            return hit
+
+        return step
+
+
+def _bodies(length, alphabet):
+    """Function bodies of `length` commands without obviously wasted turns."""
+    for body in product(alphabet, repeat=length):
+        wasted = False
+        for i in range(1, length):
+            pair = (body[i - 1], body[i])
+            if pair in (("TL", "TR"), ("TR", "TL")):
+                wasted = True
+                break
+            if i >= 2 and body[i - 2] == body[i - 1] == body[i] and body[i] in ("TL", "TR"):
+                wasted = True
+                break
+        if not wasted:
+            yield list(body)
+
+
+def _body_pairs(total):
+    """(m1, m2) pairs with `total` commands; m2 is only used alongside m1."""
+    if total == 0:
+        yield [], []
+        return
+    for len_m2 in range(0, min(total, PROGRAM_SIZES["m2"]) + 1):
+        len_m1 = total - len_m2
+        if len_m1 < 1 or len_m1 > PROGRAM_SIZES["m1"]:
+            continue
+        calls = ("M1", "M2") if len_m2 else ("M1",)
+        alphabet = PRIMITIVES + calls
+        for m1 in _bodies(len_m1, alphabet):
+            if len_m2 == 0:
+                yield m1, []
+                continue
+            for m2 in _bodies(len_m2, alphabet):
+                if m2 != m1:
+                    yield m1, m2
+
+
+def _padded(programs):
+    return {
+        name: list(programs.get(name, [])) + [None] * (size - len(programs.get(name, [])))
+        for name, size in PROGRAM_SIZES.items()
+    }
+
+
+def solve(level, node_budget=DEFAULT_NODE_BUDGET, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    Searches the smallest program solving `level` (raw dict or CompiledLevel).
+
+    Returns {"solvable", "optimal", "solution", "size", "min_actions", "stats"}:
+    `solvable` is None when the budget ran out before any answer,
+    `solution` is padded to PROGRAM_SIZES like the editor sends it.
+    """
+    started = time.monotonic()
+    lvl = compile_level_cached(level)
+    budget = _Budget(node_budget, time_budget)
+    bodies_tried = 0
+
+    def report(solvable, optimal, best=None, min_actions=None):
+        return {
+            "solvable": solvable,
+            "optimal": optimal,
+            "solution": _padded(best[1]) if best else None,
+            "size": best[0] if best else None,
+            "min_actions": min_actions,
+            "stats": {
+                "nodes": budget.nodes,
+                "bodies": bodies_tried,
+                "elapsed_ms": round((time.monotonic() - started) * 1000, 2),
+                "exhausted": not optimal,
+            },
+        }
+
+    if lvl.goal_mask == 0 or lvl.start < 0:
+        return report(False, True)
+
+    search = _Search(lvl, budget)
+    start = search.pack(land(lvl, lvl.start, 0), lvl.start_dir, 0)
+    primitives = search.primitive_actions()
+    light_once = search.primitive_actions(light_once=True)
+
+    best = None
+    min_actions = None
+    try:
+        # 1. Shortest primitive run (no slot limit): lower bound / impossibility proof
+        path = search.bfs(start, light_once, limit=float("inf"))
+        if path is None:
+            return report(False, True)
+        min_actions = len(path)
+
+        # 2. Smallest program, function bodies by increasing size
+        max_bodies = PROGRAM_SIZES["m1"] + PROGRAM_SIZES["m2"]
+        for body_size in range(0, max_bodies + 1):
+            # main needs at least one slot (a call, when bodies are used)
+            if best and body_size + 1 >= best[0]:
+                break
+
+            for m1, m2 in _body_pairs(body_size):
+                bodies_tried += 1
+                limit = PROGRAM_SIZES["main"]
+                if best:
+                    limit = min(limit, best[0] - body_size - 1)
+                if limit < 1:
+                    break
+
+                actions = list(primitives if body_size else light_once)
+                if m1 or m2:
+                    prog = compile_programs({"main": [], "m1": m1, "m2": m2})
+                    if m1:
+                        actions.append(("M1", search.macro_action(prog.code, prog.addresses["m1"])))
+                    if m2:
+                        actions.append(("M2", search.macro_action(prog.code, prog.addresses["m2"])))
+
+                main = search.bfs(start, actions, limit)
+                if main is None:
+                    continue
+
+                candidate = {"main": main, "m1": m1, "m2": m2}
+                # The BFS ignores the global step limit; the engine has the last word
+                if run_lightbot(lvl, candidate)["success"]:
+                    best = (len(main) + len(m1) + len(m2), candidate)
+
+    except _OutOfBudget:
+        return report(True if best else None, False, best, min_actions)
+
+    return report(best is not None, True, best, min_actions)
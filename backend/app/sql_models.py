@@ -1,8 +1,16 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, JSON, ForeignKey, Date
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, JSON, ForeignKey, Date, Index
+from sqlalchemy.orm import relationship, deferred, object_session
 from datetime import datetime, date
+from copy import deepcopy
 from app.database import Base
-from app.config import DEFAULT_BASE
+from app.codec import PackedLevel, PackedPrograms, PackedTrace
+
+
+def _load_level(obj, key):
+    """Resolves a level_snapshots hash through the object's session."""
+    from app.snapshots import load_level  # app.snapshots imports this module
+    return load_level(object_session(obj), key)
+
 
 class User(Base):
     __tablename__ = "users"
@@ -24,15 +32,48 @@ class User(Base):
     # We use Date (YYYY-MM-DD) to track the last reset day
     last_lives_reset = Column(Date, default=date.today)
 
-    # We store the entire BaseSnapshot ({level:..., programs:...}) here
-    base = Column(JSON, default=DEFAULT_BASE) 
-    
-    # Store drafts and base history as JSON lists
-    drafts = Column(JSON, default=list) 
-    base_history = Column(JSON, default=list)
-    
-    # Active attacks session (JSON is easiest for this temporary state)
-    active_attacks = Column(JSON, default=list)
+    # Base data lives in its own tables and is only loaded when accessed,
+    # so plain profile/auth queries never pull the JSON snapshots
+    active_base = relationship("UserBase", uselist=False, back_populates="user", cascade="all, delete-orphan")
+    base_history = relationship("BaseHistoryEntry", order_by="BaseHistoryEntry.submitted_at", back_populates="user", cascade="all, delete-orphan")
+    drafts = relationship("Draft", order_by="Draft.updated_at", back_populates="user", cascade="all, delete-orphan")
+    attack_sessions = relationship("AttackSession", back_populates="attacker", cascade="all, delete-orphan")
+
+    @property
+    def base(self):
+        """Active BaseSnapshot ({level, programs[, analysis]}), None if nothing is deployed"""
+        row = self.active_base
+        if row is None:
+            return None
+        snapshot = {"level": row.level, "programs": row.programs}
+        if row.analysis is not None:
+            snapshot["analysis"] = row.analysis
+        return snapshot
+
+    @base.setter
+    def base(self, snapshot):
+        if not snapshot:
+            self.active_base = None
+            return
+        db = object_session(self)
+        if db is None:
+            raise RuntimeError("Add the user to a session before setting its base")
+
+        from app.snapshots import store_level
+
+        if self.active_base is None:
+            self.active_base = UserBase()
+        row = self.active_base
+        level = snapshot["level"]
+        row.level_hash = store_level(db, deepcopy(level))
+        row.programs = deepcopy(snapshot["programs"])
+        row.analysis = snapshot.get("analysis")
+        row.updated_at = datetime.utcnow()
+
+        # Summary columns read by /me without loading the snapshot
+        row.name = level.get("name", "Unknown Base")
+        row.grid_size = level.get("gridSize")
+        row.goal_count = len(level.get("goals", []))
 
     # Relationships
     battle_logs_attacker = relationship("BattleLog", foreign_keys="[BattleLog.attacker_id]", back_populates="attacker")
@@ -51,11 +92,184 @@ class BattleLog(Base):
     winner_id = Column(String) # Username of winner
     score = Column(Integer)
     
-    # Store replay data (programs used) and snapshot
-    replay_data = Column(JSON) 
-    level_snapshot = Column(JSON)
+    # Store replay data (programs used) and snapshot (app/codec.py)
+    replay_data = Column(PackedPrograms)
+    level_hash = Column(String(64), ForeignKey("level_snapshots.hash"))
+    # Server-side step trace of the replay (TRACE_* records), for playback
+    replay_trace = deferred(Column(PackedTrace, nullable=True))
 
     attacker = relationship("User", foreign_keys=[attacker_id], back_populates="battle_logs_attacker")
     defender = relationship("User", foreign_keys=[defender_id], back_populates="battle_logs_defender")
 
-    is_revenged = Column(Boolean, default=False)
\ No newline at end of file
+    is_revenged = Column(Boolean, default=False)
+
+    @property
+    def level_snapshot(self):
+        return _load_level(self, self.level_hash)
+
+    # One index per access pattern (see scripts/bench_battle_logs.py)
+    __table_args__ = (
+        # Anti-farming count in /user/arena/report
+        Index("ix_battle_logs_attacker_defender_ts", "attacker_id", "defender_id", "timestamp"),
+        # Revenge update in /user/arena/report
+        Index("ix_battle_logs_defender_attacker_revenged", "defender_id", "attacker_id", "is_revenged"),
+        # Battle history / profile counts (attacker OR defender, newest first)
+        Index("ix_battle_logs_attacker_ts", "attacker_id", "timestamp"),
+        Index("ix_battle_logs_defender_ts", "defender_id", "timestamp"),
+        # Wins per player and period
+        Index("ix_battle_logs_winner_ts", "winner_id", "timestamp"),
+    )
+
+
+class LevelSnapshot(Base):
+    """
+    Immutable level keyed by its content hash (app/snapshots.py), stored
+    packed by app/codec.py. Bases, history entries, attack sessions and
+    battle logs only store the hash.
+    """
+    __tablename__ = "level_snapshots"
+
+    hash = Column(String(64), primary_key=True)
+    level = Column(PackedLevel, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UserBase(Base):
+    """The user's active base (one row per user)"""
+    __tablename__ = "bases"
+
+    username = Column(String, ForeignKey("users.username", ondelete="CASCADE"), primary_key=True)
+    level_hash = Column(String(64), ForeignKey("level_snapshots.hash"))
+    programs = deferred(Column(JSON))
+
+    # Precomputed base_info (kept in sync by the User.base setter)
+    name = Column(String)
+    grid_size = Column(Integer)
+    goal_count = Column(Integer)
+
+    # Solver summary (app/solver.py), filled in after submit
+    analysis = deferred(Column(JSON, nullable=True))
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    user = relationship("User", back_populates="active_base")
+
+    @property
+    def level(self):
+        return _load_level(self, self.level_hash)
+
+
+class BaseHistoryEntry(Base):
+    """Last submitted bases (trimmed to 20 per user)"""
+    __tablename__ = "base_history"
+
+    id = Column(String, primary_key=True)
+    username = Column(String, ForeignKey("users.username", ondelete="CASCADE"), nullable=False)
+    submitted_at = Column(DateTime, default=datetime.utcnow)
+    level_hash = Column(String(64), ForeignKey("level_snapshots.hash"))
+    programs = deferred(Column(JSON))
+
+    user = relationship("User", back_populates="base_history")
+
+    @property
+    def level(self):
+        return _load_level(self, self.level_hash)
+
+    __table_args__ = (
+        Index("ix_base_history_username_submitted_at", "username", "submitted_at"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "level": self.level,
+            "programs": self.programs,
+            "submittedAt": self.submitted_at.isoformat(),
+        }
+
+
+class Draft(Base):
+    __tablename__ = "drafts"
+
+    id = Column(String, primary_key=True)
+    username = Column(String, ForeignKey("users.username", ondelete="CASCADE"), nullable=False)
+    name = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    level = deferred(Column(JSON))
+    programs = deferred(Column(JSON))
+
+    user = relationship("User", back_populates="drafts")
+
+    __table_args__ = (
+        Index("ix_drafts_username_updated_at", "username", "updated_at"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "level": self.level,
+            "programs": self.programs,
+            "updatedAt": self.updated_at.isoformat(),
+        }
+
+
+class AttackSession(Base):
+    """An ongoing arena attack (one per attacker/target pair)"""
+    __tablename__ = "attack_sessions"
+
+    id = Column(Integer, primary_key=True)
+    attacker_id = Column(String, ForeignKey("users.username", ondelete="CASCADE"), nullable=False)
+    target_user = Column(String, nullable=False)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+    snapshot_id = Column(String, nullable=True)
+    # Level the attacker was served, replays are verified against it
+    frozen_level_hash = Column(String(64), ForeignKey("level_snapshots.hash"))
+
+    attacker = relationship("User", back_populates="attack_sessions")
+
+    @property
+    def frozen_level(self):
+        return _load_level(self, self.frozen_level_hash)
+
+    __table_args__ = (
+        Index("ix_attack_sessions_attacker_target", "attacker_id", "target_user", unique=True),
+    )
+
+
+class DeployedBase(Base):
+    """
+    Denormalized summary of every deployed base, kept in sync by
+    app/matchmaking.py so opponent listing never loads the User JSON blobs.
+    """
+    __tablename__ = "deployed_bases"
+
+    username = Column(String, ForeignKey("users.username"), primary_key=True)
+    trophies = Column(Integer, default=1000, index=True)
+    level = Column(Integer, default=1, index=True)
+
+    name = Column(String)
+    grid_size = Column(Integer)
+    goal_count = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_deployed_bases_level_trophies", "level", "trophies"),
+    )
+
+
+class WinCounter(Base):
+    """
+    Leaderboard wins per user and period, maintained by app/leaderboard.py
+    whenever a battle is logged. `period` is "alltime" or an ISO day
+    ("2026-01-31"); weekly standings sum the last 7 day rows.
+    """
+    __tablename__ = "win_counters"
+
+    username = Column(String, primary_key=True)
+    period = Column(String, primary_key=True)
+    wins = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index("ix_win_counters_period_wins", "period", "wins"),
+    )
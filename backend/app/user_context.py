@@ -0,0 +1,215 @@
+"""
+Cached per-user context for routes that only need the hot scalar fields.
+
+`get_current_user_context` (`get_current_user_context_async` for routes
+on an AsyncSession) resolves the token's user to a `UserContext`
+(User scalars plus the active base summary) from a small TTL cache, so
+/me-style routes skip the users round trip. Any commit that touches a
+User or UserBase row (ORM flush or bulk UPDATE/DELETE) invalidates the
+affected contexts in this process; the TTL bounds staleness for writes
+made by other worker processes.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from itertools import chain
+from typing import NamedTuple, Optional
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+
+from app.auth import get_current_user
+from app.config import USER_CONTEXT_TTL, USER_CONTEXT_CACHE_SIZE
+from app.database import get_db, get_async_db
+from app.sql_models import User, UserBase
+
+
+class UserContext(NamedTuple):
+    username: str
+    tutorial_progress: int
+    coins: int
+    trophies: int
+    wins: int
+    experience: int
+    lives: int
+    last_lives_reset: Optional[date]
+    joined_at: Optional[datetime]
+    # Active base summary (base_owner is None without a deployed base)
+    base_owner: Optional[str]
+    base_name: Optional[str]
+    base_grid_size: Optional[int]
+    base_goal_count: Optional[int]
+
+
+CONTEXT_COLUMNS = (
+    User.username,
+    User.tutorial_progress,
+    User.coins,
+    User.trophies,
+    User.wins,
+    User.experience,
+    User.lives,
+    User.last_lives_reset,
+    User.joined_at,
+    UserBase.username.label("base_owner"),
+    UserBase.name.label("base_name"),
+    UserBase.grid_size.label("base_grid_size"),
+    UserBase.goal_count.label("base_goal_count"),
+)
+
+
+class _ContextCache:
+    """
+    Username -> UserContext with TTL. A generation counter, bumped on every
+    invalidation, keeps a load that raced with a commit from being cached.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username):
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end(username)
+            return entry[1]
+
+    def put(self, context, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[context.username] = (time.monotonic() + self.ttl, context)
+            self._entries.move_to_end(context.username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, usernames):
+        with self._lock:
+            self.generation += 1
+            for username in usernames:
+                self._entries.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+user_context_cache = _ContextCache(USER_CONTEXT_TTL, USER_CONTEXT_CACHE_SIZE)
+
+
+def load_user_context(db: Session, username: str) -> Optional[UserContext]:
+    """The user's context, from the cache or one projected query (None if unknown)."""
+    context = user_context_cache.get(username)
+    if context is not None:
+        return context
+
+    generation = user_context_cache.generation
+    row = (
+        db.query(*CONTEXT_COLUMNS)
+        .outerjoin(UserBase, UserBase.username == User.username)
+        .filter(User.username == username)
+        .first()
+    )
+    if row is None:
+        return None
+    context = UserContext(**row._mapping)
+    user_context_cache.put(context, generation)
+    return context
+
+
+def get_current_user_context(
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> UserContext:
+    context = load_user_context(db, current_user)
+    if context is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return context
+
+
+async def get_current_user_context_async(
+    current_user: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+) -> UserContext:
+    """`get_current_user_context` for async routes (same cache)."""
+    context = await db.run_sync(load_user_context, current_user)
+    if context is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return context
+
+
+# --- INVALIDATION ---
+# Usernames written in a transaction are collected in session.info and
+# dropped from the cache once it commits (None = clear everything)
+
+_DIRTY_KEY = "user_context_dirty"
+
+
+def _mark_dirty(session, usernames):
+    dirty = session.info.get(_DIRTY_KEY, set())
+    if dirty is not None:
+        if usernames is None:
+            dirty = None
+        else:
+            dirty.update(usernames)
+    session.info[_DIRTY_KEY] = dirty
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session, flush_context):
+    usernames = {
+        obj.username
+        for obj in chain(session.new, session.dirty, session.deleted)
+        if isinstance(obj, (User, UserBase))
+    }
+    if usernames:
+        _mark_dirty(session, usernames)
+
+
+def _bulk_target(statement):
+    """{username} for a `WHERE username = <value> [AND ...]` bulk write, None otherwise."""
+    clause = statement.whereclause
+    clauses = [clause]
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        clauses = clause.clauses
+    for clause in clauses:
+        if (
+            isinstance(clause, BinaryExpression)
+            and clause.operator is operators.eq
+            and getattr(clause.left, "name", None) == "username"
+            and isinstance(clause.right, BindParameter)
+        ):
+            return {clause.right.value}
+    return None
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_writes(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (User, UserBase):
+        _mark_dirty(orm_execute_state.session, _bulk_target(orm_execute_state.statement))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    # Marks left by a rolled-back transaction only cause extra invalidations
+    if _DIRTY_KEY not in session.info:
+        return
+    dirty = session.info.pop(_DIRTY_KEY)
+    if dirty is None:
+        user_context_cache.clear()
+    else:
+        user_context_cache.invalidate(dirty)
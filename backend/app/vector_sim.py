@@ -0,0 +1,185 @@
+"""
+NumPy lockstep engine: one level, many programs.
+
+Meant for analytics / difficulty scoring, where thousands of candidate
+programs are run against the same base. Every robot executes one
+instruction per iteration; finished runs are masked out.
+
+The lockstep engine has no cycle detection, so robots still running after
+`handoff_steps` (or recursing deeper than STACK_LIMIT) are finished by the
+scalar `run_lightbot`, which short-circuits infinite programs. Outcomes
+(success / reason) match `run_lightbot` exactly, which
+scripts/check_vector_sim.py verifies against the bundled levels.
+"""
+import numpy as np
+
+from .simulator import (
+    MAX_STEPS,
+    OP_F, OP_J, OP_TL, OP_TR, OP_L, OP_RET, OP_CALL,
+    compile_level_cached, compile_programs, build_landing_table, land, run_lightbot,
+)
+
+REASONS = ("SUCCESS", "GOALS_NOT_LIT", "TIME_LIMIT_EXCEEDED")
+_SUCCESS, _NOT_LIT, _TIME_LIMIT, _HANDOFF = 0, 1, 2, -1
+
+HANDOFF_STEPS = 256
+STACK_LIMIT = 64
+
+
+def _level_arrays(lvl):
+    """Per-level lookup arrays shared by every chunk."""
+    cells = lvl.size * lvl.size
+
+    # Missing heights become NaN: every comparison with them fails,
+    # which is exactly how the scalar engine treats them.
+    heights = np.array(
+        [np.nan if h is None else h for h in lvl.heights], dtype=np.float64
+    )
+    # Sentinel cell `cells` for "off the grid"
+    heights = np.append(heights, np.nan)
+
+    neighbors = np.array(lvl.neighbors, dtype=np.int64)
+    neighbors[neighbors < 0] = cells
+
+    # landing[cell * 5 + 1 + facing]: final cell after walking onto `cell`
+    landing = np.array(build_landing_table(lvl), dtype=np.int64)
+
+    goal_index = np.full(cells, -1, dtype=np.int64)
+    n_goals = lvl.goal_mask.bit_length()
+    for cell, bit in enumerate(lvl.goal_bit):
+        if bit:
+            goal_index[cell] = bit.bit_length() - 1
+
+    return heights, neighbors, landing, goal_index, n_goals
+
+
+def _run_chunk(lvl, arrays, start_pos, codes, handoff_steps):
+    heights, neighbors, landing, goal_index, n_goals = arrays
+    n = len(codes)
+
+    width = max(len(c) for c in codes)
+    code = np.full((n, width), OP_RET, dtype=np.int64)
+    for i, c in enumerate(codes):
+        code[i, :len(c)] = c
+
+    pos = np.full(n, start_pos, dtype=np.int64)
+    facing = np.full(n, lvl.start_dir, dtype=np.int64)
+    ip = np.zeros(n, dtype=np.int64)
+    lit = np.zeros((n, max(1, n_goals)), dtype=bool)
+    lit_count = np.zeros(n, dtype=np.int64)
+
+    stack = np.zeros((n, STACK_LIMIT), dtype=np.int64)
+    sp = np.zeros(n, dtype=np.int64)
+
+    outcome = np.full(n, _TIME_LIMIT, dtype=np.int64)
+    active = np.arange(n)
+
+    for step in range(1, MAX_STEPS + 1):
+        if active.size == 0:
+            break
+        if step > handoff_steps:
+            outcome[active] = _HANDOFF
+            break
+
+        op = code[active, ip[active]]
+        ip[active] += 1
+        done = np.zeros(active.size, dtype=bool)
+
+        # --- MOVES (F / J) ---
+        m = (op == OP_F) | (op == OP_J)
+        if m.any():
+            r = active[m]
+            nxt = neighbors[facing[r], pos[r]]
+            h0 = heights[pos[r]]
+            h1 = heights[nxt]
+            ok = np.where(
+                op[m] == OP_F,
+                h1 == h0,
+                (h1 != h0) & (h1 <= h0 + 1),
+            )
+            r = r[ok]
+            pos[r] = landing[nxt[ok] * 5 + 1 + facing[r]]
+
+        # --- TURNS ---
+        m = op == OP_TL
+        if m.any():
+            r = active[m]
+            facing[r] = (facing[r] + 3) % 4
+        m = op == OP_TR
+        if m.any():
+            r = active[m]
+            facing[r] = (facing[r] + 1) % 4
+
+        # --- LIGHT ---
+        m = op == OP_L
+        if m.any():
+            r = active[m]
+            g = goal_index[pos[r]]
+            on_goal = g >= 0
+            r, g = r[on_goal], g[on_goal]
+            lit[r, g] ^= True
+            lit_count[r] += np.where(lit[r, g], 1, -1)
+            won = lit_count[active] == n_goals
+            won &= m
+            outcome[active[won]] = _SUCCESS
+            done |= won
+
+        # --- RETURN ---
+        m = op == OP_RET
+        if m.any():
+            r = active[m]
+            finished = sp[r] == 0
+            outcome[r[finished]] = _TIME_LIMIT if step >= MAX_STEPS else _NOT_LIT
+            idx = np.flatnonzero(m)
+            done[idx[finished]] = True
+            r = r[~finished]
+            sp[r] -= 1
+            ip[r] = stack[r, sp[r]]
+
+        # --- CALL ---
+        m = op >= OP_CALL
+        if m.any():
+            # Too deep for the fixed-size stack: leave it to the scalar engine
+            deep = m & (sp[active] >= STACK_LIMIT)
+            if deep.any():
+                outcome[active[deep]] = _HANDOFF
+                done |= deep
+                m &= ~deep
+            r = active[m]
+            stack[r, sp[r]] = ip[r]
+            sp[r] += 1
+            ip[r] = op[m] - OP_CALL
+
+        if done.any():
+            active = active[~done]
+
+    return outcome
+
+
+def run_lightbot_vectorized(level, programs_list, chunk_size=1024, handoff_steps=HANDOFF_STEPS):
+    """
+    Runs every programs dict in `programs_list` on `level`
+    (raw dict or CompiledLevel). Returns one {"success", "reason"}
+    dict per program, in order. Chunking bounds the array memory.
+    """
+    lvl = compile_level_cached(level)
+
+    if lvl.goal_mask == 0:
+        return [{"success": False, "reason": "NO_GOALS"} for _ in programs_list]
+    if lvl.start < 0:
+        return [{"success": False, "reason": "INVALID_START"} for _ in programs_list]
+
+    arrays = _level_arrays(lvl)
+    start_pos = land(lvl, lvl.start, 0)
+    codes = [compile_programs(p).code for p in programs_list]
+
+    results = []
+    for i in range(0, len(codes), chunk_size):
+        outcome = _run_chunk(lvl, arrays, start_pos, codes[i:i + chunk_size], handoff_steps)
+        for j, o in enumerate(outcome.tolist()):
+            if o == _HANDOFF:
+                result = run_lightbot(lvl, programs_list[i + j])
+                results.append({"success": result["success"], "reason": result["reason"]})
+            else:
+                results.append({"success": o == _SUCCESS, "reason": REASONS[o]})
+    return results
@@ -1,19 +1,52 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
+from datetime import datetime
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import engine, Base
-# Ensure all models are imported so tables are created
+from app.database import engine, async_engine, Base, SessionLocal
+# Ensure all models are imported so tables are created (DB_CREATE_ALL)
 import app.sql_models 
-from app.routers import auth, arena, bases, levels, music, users, tutorials
+from app.sim_executor import sim_executor, analysis_executor
+from app.password_hasher import password_hasher
+from app.config import PASSWORD_HASH_STATS_INTERVAL, DB_CREATE_ALL
+from app.matchmaking import backfill_deployed_bases
+from app.leaderboard import prune_daily_counters
+from app.routers import auth, arena, bases, levels, music, users, tutorials, simulate
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("🚀 Starting up: Creating Database Tables...")
-    Base.metadata.create_all(bind=engine)
+    # The schema belongs to Alembic (`alembic upgrade head` before starting);
+    # create_all is only for tests and throwaway dev databases
+    if DB_CREATE_ALL:
+        print("🚀 Starting up: Creating Database Tables (DB_CREATE_ALL)...")
+        Base.metadata.create_all(bind=engine)
+    else:
+        print("🚀 Starting up...")
+    db = SessionLocal()
+    try:
+        backfilled = backfill_deployed_bases(db)
+        if backfilled:
+            print(f"🗂️ Backfilled {backfilled} deployed bases for matchmaking")
+        pruned = prune_daily_counters(db, datetime.utcnow().date())
+        db.commit()
+        if pruned:
+            print(f"🧹 Pruned {pruned} expired daily win counters")
+    finally:
+        db.close()
+    stats_logger = None
+    if PASSWORD_HASH_STATS_INTERVAL > 0:
+        stats_logger = asyncio.create_task(password_hasher.log_stats_periodically())
     yield
     print("🛑 Shutting down...")
+    if stats_logger is not None:
+        stats_logger.cancel()
+    password_hasher.log_stats()
+    sim_executor.shutdown()
+    analysis_executor.shutdown()
+    password_hasher.shutdown()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Lightbot API",
@@ -40,6 +73,7 @@ app.include_router(levels.router)
 app.include_router(users.router)
 app.include_router(music.router)
 app.include_router(tutorials.router)
+app.include_router(simulate.router)
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,178 @@
+"""
+Benchmark for the battle_logs access patterns.
+
+Seeds a throwaway database with synthetic users and battle logs, then runs
+every battle_logs query the API issues twice: once with only the primary
+key index and once with the composite indexes from
+alembic/versions/0005_battle_log_indexes.py. For each query it records
+the query plan and the median timing.
+
+Usage (from backend/):
+    python -m scripts.bench_battle_logs [--logs 300000] [--users 2000]
+        [--runs 50] [--url sqlite:////tmp/bench.db] [--json report.json]
+
+Without --url a temporary SQLite file is used. Postgres URLs work too;
+the plans then come from EXPLAIN ANALYZE.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# app.database refuses to import without a DATABASE_URL
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine, select, update, func, or_, insert
+
+from app.database import Base
+from app.sql_models import User, BattleLog
+from app.routers.arena import _history_page_query
+
+COMPOSITE_INDEXES = [i for i in BattleLog.__table__.indexes if len(i.columns) > 1]
+
+
+def seed(engine, n_users, n_logs, rng):
+    users = [f"user{i}" for i in range(n_users)]
+    now = datetime.utcnow()
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"username": u, "trophies": rng.randint(0, 3000), "experience": 0}
+            for u in users
+        ])
+
+        batch = []
+        for i in range(n_logs):
+            attacker, defender = rng.sample(users, 2)
+            batch.append({
+                "attacker_id": attacker,
+                "defender_id": defender,
+                "winner_id": attacker if rng.random() < 0.5 else defender,
+                "score": rng.randint(0, 1000),
+                "timestamp": now - timedelta(seconds=rng.randint(0, 90 * 86400)),
+                "is_revenged": rng.random() < 0.3,
+            })
+            if len(batch) == 10_000:
+                conn.execute(insert(BattleLog), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(BattleLog), batch)
+
+    return users
+
+
+def endpoint_queries(me, other, now):
+    """(name, statement) for every battle_logs query, as issued by the routers."""
+    mine = or_(BattleLog.attacker_id == me, BattleLog.defender_id == me)
+    return [
+        ("report: anti-farming count", select(func.count(BattleLog.id)).where(
+            BattleLog.attacker_id == me,
+            BattleLog.defender_id == other,
+            BattleLog.timestamp > now - timedelta(minutes=30),
+        )),
+        ("report: revenge update", update(BattleLog).where(
+            BattleLog.defender_id == me,
+            BattleLog.attacker_id == other,
+            BattleLog.is_revenged == False,
+        ).values(is_revenged=True)),
+        ("arena/history: first page", _history_page_query(me, 50, None)),
+        ("arena/history: keyset page", _history_page_query(me, 50, (now - timedelta(days=30), 0))),
+        ("profile: total battles", select(func.count(BattleLog.id)).where(mine)),
+        ("wins in the last 7 days", select(func.count(BattleLog.id)).where(
+            BattleLog.winner_id == me,
+            BattleLog.timestamp >= now - timedelta(days=7),
+        )),
+    ]
+
+
+def explain(conn, stmt):
+    sql = str(stmt.compile(conn.engine, compile_kwargs={"literal_binds": True}))
+    if conn.engine.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql).all()
+        return [row[-1] for row in rows]
+    rows = conn.exec_driver_sql("EXPLAIN ANALYZE " + sql).all()
+    return [row[0] for row in rows]
+
+
+def measure(engine, users, runs, rng):
+    now = datetime.utcnow()
+    report = {}
+
+    with engine.connect() as conn:
+        for name, _ in endpoint_queries(users[0], users[1], now):
+            report[name] = {"timings_ms": []}
+
+        for _ in range(runs):
+            me, other = rng.sample(users, 2)
+            for name, stmt in endpoint_queries(me, other, now):
+                trans = conn.begin()
+                start = time.perf_counter()
+                result = conn.execute(stmt)
+                if result.returns_rows:
+                    result.all()
+                report[name]["timings_ms"].append((time.perf_counter() - start) * 1000)
+                # Keep the data identical between passes
+                trans.rollback()
+
+        for name, stmt in endpoint_queries(users[0], users[1], now):
+            trans = conn.begin()
+            report[name]["plan"] = explain(conn, stmt)
+            trans.rollback()
+
+    for entry in report.values():
+        timings = entry.pop("timings_ms")
+        entry["median_ms"] = round(statistics.median(timings), 3)
+        entry["max_ms"] = round(max(timings), 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logs", type=int, default=300_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="database URL (default: temporary SQLite file)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    url = args.url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(url)
+    rng = random.Random(args.seed)
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    for index in COMPOSITE_INDEXES:
+        index.drop(engine)
+
+    print(f"Seeding {args.users} users / {args.logs} battle logs into {url} ...")
+    users = seed(engine, args.users, args.logs, rng)
+
+    report = {"logs": args.logs, "users": args.users, "runs": args.runs}
+    report["without_indexes"] = measure(engine, users, args.runs, random.Random(args.seed))
+    for index in COMPOSITE_INDEXES:
+        index.create(engine)
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    report["with_indexes"] = measure(engine, users, args.runs, random.Random(args.seed))
+
+    for name in report["with_indexes"]:
+        before = report["without_indexes"][name]
+        after = report["with_indexes"][name]
+        print(f"\n{name}")
+        print(f"  without indexes: {before['median_ms']:>9.3f} ms  | {'; '.join(before['plan'])}")
+        print(f"  with indexes:    {after['median_ms']:>9.3f} ms  | {'; '.join(after['plan'])}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Concurrency benchmark for the write-heavy routes.
+
+Each client thread registers a player, then loops over
+POST /user/base/submit, GET /user/arena/target/{other} and
+POST /user/arena/report against the other players, all in parallel.
+Reports per-endpoint latency percentiles, throughput and 5xx responses;
+in-process runs also count the "database is locked" errors raised.
+
+Usage (from backend/):
+    python -m scripts.bench_concurrency [--clients 16] [--seconds 10]
+        [--server http://localhost:8000] [--json report.json]
+
+Without --server the app runs in-process against a temporary SQLite file,
+with the engine settings from the environment (see app/config.py), e.g.:
+    SQLITE_WAL=0 python -m scripts.bench_concurrency
+    python -m scripts.bench_concurrency
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from copy import deepcopy
+
+from sqlalchemy import event
+
+ENDPOINTS = ("submit", "target", "report")
+
+
+def make_client(server):
+    if server:
+        import httpx
+        return httpx.Client(base_url=server, timeout=60), None
+
+    # The app reads its settings at import time
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"))
+    os.environ.setdefault("SECRET_KEY", "bench")
+    # Throwaway database: let the app build the schema itself
+    os.environ.setdefault("DB_CREATE_ALL", "1")
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app, raise_server_exceptions=False)
+    client.__enter__()
+    return client, main
+
+
+class Stats:
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.locked = 0
+        self._lock = threading.Lock()
+
+    def count_locked(self, context):
+        if "database is locked" in str(context.original_exception):
+            with self._lock:
+                self.locked += 1
+
+    def record(self, endpoint, started, response):
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.timings[endpoint].append(elapsed)
+            if response.status_code >= 500:
+                self.errors[endpoint] += 1
+
+    def summary(self, seconds):
+        report = {}
+        for endpoint in ENDPOINTS:
+            timings = sorted(self.timings[endpoint])
+            if not timings:
+                continue
+            pick = lambda q: round(timings[min(len(timings) - 1, int(q * len(timings)))], 2)
+            report[endpoint] = {
+                "requests": len(timings),
+                "per_second": round(len(timings) / seconds, 1),
+                "errors": self.errors[endpoint],
+                "p50_ms": round(statistics.median(timings), 2),
+                "p95_ms": pick(0.95),
+                "p99_ms": pick(0.99),
+                "max_ms": round(timings[-1], 2),
+            }
+        return report
+
+
+def register(client, username):
+    client.post("/register", json={"username": username, "password": "bench"})
+    response = client.post("/token", data={"username": username, "password": "bench"})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def run_client(client, me, headers, others, base, deadline, stats):
+    i = 0
+    while time.perf_counter() < deadline:
+        i += 1
+        # A new name per submit: every deploy writes a new level snapshot
+        snapshot = deepcopy(base)
+        snapshot["level"]["name"] = f"{me} #{i}"
+        started = time.perf_counter()
+        stats.record("submit", started, client.post("/user/base/submit", json=snapshot, headers=headers))
+
+        target = others[i % len(others)]
+        started = time.perf_counter()
+        response = client.get(f"/user/arena/target/{target}", headers=headers)
+        stats.record("target", started, response)
+        if response.status_code != 200:
+            continue
+
+        # The default layout is solved by lighting the start cell
+        started = time.perf_counter()
+        stats.record("report", started, client.post("/user/arena/report", json={
+            "targetUser": target,
+            "score": 100,
+            "coinsEarned": 0,
+            "replay_programs": base["programs"],
+        }, headers=headers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--server", help="benchmark a running server instead of an in-process app")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    client, app_module = make_client(args.server)
+    from app.config import DEFAULT_BASE
+
+    run_id = int(time.time())
+    players = [f"bench{run_id}_{n}" for n in range(args.clients)]
+    headers = {player: register(client, player) for player in players}
+
+    settings = {"clients": args.clients, "seconds": args.seconds, "server": args.server}
+    if app_module is not None:
+        from app.database import engine
+        with engine.connect() as conn:
+            settings["database"] = engine.url.render_as_string(hide_password=True)
+            if engine.dialect.name == "sqlite":
+                settings["journal_mode"] = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+                settings["busy_timeout_ms"] = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        settings["pool"] = engine.pool.status()
+    print(f"Settings: {settings}")
+
+    stats = Stats()
+    if app_module is not None:
+        event.listen(engine, "handle_error", stats.count_locked)
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=run_client, args=(
+            client, player, headers[player], [p for p in players if p != player],
+            DEFAULT_BASE, deadline, stats,
+        ))
+        for player in players
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    report = stats.summary(elapsed)
+    print(f"\n{'endpoint':<8} {'reqs':>6} {'req/s':>7} {'5xx':>5} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for endpoint, row in report.items():
+        print(f"{endpoint:<8} {row['requests']:>6} {row['per_second']:>7} {row['errors']:>5} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}")
+    if app_module is not None:
+        print(f"\n'database is locked' errors: {stats.locked}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "settings": settings,
+                "endpoints": report,
+                "database_locked": stats.locked if app_module is not None else None,
+            }, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+    if app_module is not None:
+        client.__exit__(None, None, None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Differential check: app.vector_sim must agree with app.simulator.run_lightbot.
+
+Runs random programs (within the editor's PROGRAM_SIZES) against every level
+in Levels/levels.py, Levels/tutorial_levels.py and Levels/levels_data.json
+and reports any outcome mismatch. Exits non-zero on mismatch.
+
+Usage (from backend/):
+    python -m scripts.check_vector_sim [programs_per_level] [seed] [handoff_steps]
+
+Pass handoff_steps=5000 to check the pure lockstep path with no scalar handoff.
+"""
+import json
+import random
+import sys
+from pathlib import Path
+
+from app.simulator import run_lightbot
+from app.vector_sim import run_lightbot_vectorized, HANDOFF_STEPS
+from Levels.levels import LEVELS
+from Levels.tutorial_levels import TUTORIAL_LEVELS
+
+PROGRAM_SIZES = {"main": 12, "m1": 8, "m2": 8}
+COMMANDS = ["F", "J", "TL", "TR", "L", "M1", "M2", None]
+
+LEVELS_DATA = Path(__file__).resolve().parent.parent / "Levels" / "levels_data.json"
+
+
+def random_programs(rng):
+    return {
+        panel: [rng.choice(COMMANDS) for _ in range(rng.randint(0, size))]
+        for panel, size in PROGRAM_SIZES.items()
+    }
+
+
+def main():
+    per_level = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    rng = random.Random(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+    handoff_steps = int(sys.argv[3]) if len(sys.argv) > 3 else HANDOFF_STEPS
+
+    levels = list(LEVELS) + list(TUTORIAL_LEVELS) + json.loads(LEVELS_DATA.read_text())
+    mismatches = 0
+    total = 0
+
+    for level in levels:
+        programs_list = [random_programs(rng) for _ in range(per_level)]
+        vectorized = run_lightbot_vectorized(level, programs_list, handoff_steps=handoff_steps)
+
+        for programs, got in zip(programs_list, vectorized):
+            expected = run_lightbot(level, programs)
+            total += 1
+            if (got["success"], got["reason"]) != (expected["success"], expected["reason"]):
+                mismatches += 1
+                print(f"MISMATCH level={level.get('id')} programs={programs} "
+                      f"expected={expected['reason']} got={got['reason']}")
+
+    print(f"{total} runs over {len(levels)} levels, {mismatches} mismatches")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
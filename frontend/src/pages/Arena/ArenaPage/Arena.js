@@ -179,7 +179,7 @@ export default function Arena() {
                                             <span className="stat-lbl">Rank</span>
                                         </div>
                                         <div className="stat-item">
-                                            <span className="stat-val">{base.goals?.length || 0}</span>
+                                            <span className="stat-val">{base.goalCount ?? base.goals?.length ?? 0}</span>
                                             <span className="stat-lbl">Goals</span>
                                         </div>
                                         <div className="stat-item">
@@ -205,20 +205,23 @@ export default function AttackPage() {
             coins = BASE_COIN_REWARD + Math.floor(totalScore / 50);
         }
 
-        const serverResponse = await submitBattleResult({
-            win: isWin,
-            score,
-            coins,
-            programs: programsRef.current || game.programs
-        });
-
-        const finalXp = serverResponse?.gained_exp || 0;
-
-        const resultObj = {
+        // The server replays the program and decides the outcome and rewards
+        const serverResponse = await submitBattleResult(programsRef.current || game.programs);
+
+        // Local estimate only when the report itself failed
+        const resultObj = serverResponse ? {
+            win: serverResponse.isWin,
+            score: serverResponse.score,
+            coins: serverResponse.coins_earned,
+            xp: serverResponse.gained_exp || 0,
+            timeBonus: serverResponse.time_bonus,
+            stepsUsed: steps || 0,
+            reason: failureReason
+        } : {
             win: isWin,
             score,
             coins,
-            xp: finalXp,
+            xp: 0,
             timeBonus,
             stepsUsed: steps || 0,
             reason: failureReason
@@ -228,7 +231,7 @@ export default function AttackPage() {
         setShowResultModal(true);
     };
 
-    const submitBattleResult = async (resultData) => {
+    const submitBattleResult = async (programs) => {
         try {
             const res = await fetch(`${API_URL}/user/arena/report`, {
                 method: "POST",
@@ -239,11 +242,7 @@ export default function AttackPage() {
                 body: JSON.stringify({
                     targetUser: username,
                     snapshotId: snapshotId, 
-                    isWin: resultData.win,
-                    score: resultData.score,
-                    coinsEarned: resultData.coins,
-                    timeRemaining: timeLeft || 0, 
-                    replay_programs: resultData.programs,
+                    replay_programs: programs,
                     level_snapshot: levelData 
                 })
             });
@@ -253,7 +252,7 @@ export default function AttackPage() {
         } catch (error) {
             console.error("Failed to report battle result", error);
         }
-        return { gained_exp: 0 }; 
+        return null; 
     };
 
     // --- RETREAT ACTIONS ---
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from "../../../context/AuthContext";
 import './BattleHistory.css';
@@ -9,6 +9,8 @@ export default function BattleHistory({ onClose }) {
     
     // Data State
     const [history, setHistory] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const olderLoaded = useRef(false);
     const [filter, setFilter] = useState('ALL'); 
     
     // Revenge State
@@ -25,9 +27,18 @@ export default function BattleHistory({ onClose }) {
             })
             .then(res => res.json())
             .then(data => {
-                // Optional: Check if data actually changed to avoid unnecessary re-renders, 
-                // but React state updates are usually efficient enough for simple lists.
-                setHistory(data);
+                // Refresh the newest page, keep any older pages already loaded
+                const items = data.items || [];
+                if (!olderLoaded.current) {
+                    setHistory(items);
+                    setNextCursor(data.nextCursor);
+                    return;
+                }
+                const oldest = items[items.length - 1];
+                setHistory(prev => [
+                    ...items,
+                    ...(oldest ? prev.filter(p => p.timestamp < oldest.timestamp) : prev)
+                ]);
             })
             .catch(err => console.error("Failed to load history", err));
         };
@@ -43,6 +54,20 @@ export default function BattleHistory({ onClose }) {
 
     }, [token]);
 
+    const loadOlder = () => {
+        if (!nextCursor) return;
+        fetch(`${process.env.REACT_APP_API_URL}/user/arena/history?cursor=${encodeURIComponent(nextCursor)}`, {
+            headers: { Authorization: `Bearer ${token}` }
+        })
+        .then(res => res.json())
+        .then(data => {
+            olderLoaded.current = true;
+            setHistory(prev => [...prev, ...(data.items || [])]);
+            setNextCursor(data.nextCursor);
+        })
+        .catch(err => console.error("Failed to load older battles", err));
+    };
+
     const filteredHistory = history.filter(item => {
         if (filter === 'ALL') return true;
         return item.type === filter;
@@ -58,16 +83,23 @@ export default function BattleHistory({ onClose }) {
     const cancelRevenge = () => setRevengeTarget(null);
 
 const handleReplay = (log) => {
-    // Ensure we have programs. 
-    // Even if the user placed 0 commands, the replay should technically load an empty sidebar.
-    // We strictly check for 'undefined' or 'null' rather than truthiness if possible.
-    if (!log.replay_programs) {
-        alert("Corrupted data: No command logs found for this battle.");
-        return;
-    }
-    
-    if (onClose) onClose();
-    navigate("/replay", { state: { log: log } });
+    // Replay programs and the level snapshot are only fetched when needed
+    fetch(`${process.env.REACT_APP_API_URL}/user/arena/history/${log.id}`, {
+        headers: { Authorization: `Bearer ${token}` }
+    })
+    .then(res => res.json())
+    .then(detail => {
+        // Ensure we have programs. 
+        // Even if the user placed 0 commands, the replay should technically load an empty sidebar.
+        if (!detail.replay_programs) {
+            alert("Corrupted data: No command logs found for this battle.");
+            return;
+        }
+
+        if (onClose) onClose();
+        navigate("/replay", { state: { log: { ...log, ...detail } } });
+    })
+    .catch(err => console.error("Failed to load replay", err));
 };
 
     return (
@@ -127,7 +159,7 @@ const handleReplay = (log) => {
                     <div className="no-history">No battle records found.</div>
                 ) : (
                     filteredHistory.map((log, index) => (
-                        <div key={index} className={`history-card ${log.isWin ? 'win' : 'loss'}`}>
+                        <div key={log.id ?? index} className={`history-card ${log.isWin ? 'win' : 'loss'}`}>
                             <div className="card-icon">
                                 {log.type === 'ATTACK' ? '⚔️' : '🛡️'}
                             </div>
@@ -151,7 +183,7 @@ const handleReplay = (log) => {
                                     </div>
 
                                     <div style={{ display: 'flex', gap: '8px' }}>
-                                        {log.replay_programs && (
+                                        {log.hasReplay && (
                                             <button className="btn-replay" onClick={() => handleReplay(log)} title="Watch Replay">📹</button>
                                         )}
                                         {log.type === 'DEFENSE' && !log.isWin && (
@@ -169,6 +201,9 @@ const handleReplay = (log) => {
                         </div>
                     ))
                 )}
+                {nextCursor && (
+                    <button className="btn-load-more" onClick={loadOlder}>Load older battles</button>
+                )}
             </div>
         </div>
     );